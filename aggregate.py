@@ -0,0 +1,156 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from columnar import Categorical, Text
+from statement import getter
+
+
+def _first_appearance(codes, categories):
+    # Renumber codes so categories come out in the order they first appear in the data,
+    # the same order the old defaultdict based counting produced
+    unique, first = np.unique(codes, return_index=True)
+    order = unique[np.argsort(first, kind='mergesort')]
+    remap = np.zeros(len(categories), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    return remap[codes], [categories[i] for i in order]
+
+
+class Aggregator:
+    # Dictionary encodes each column once into integer codes, then counts with np.bincount.
+    # `data` is either a list of statement dicts or a table from columnar.load
+    def __init__(self, data):
+        self.data = data
+        self.encoded = {}
+
+    def __len__(self):
+        if isinstance(self.data, dict):
+            return len(next(iter(self.data.values())))
+        return len(self.data)
+
+    def encode(self, key):
+        if key not in self.encoded:
+            if isinstance(self.data, dict):
+                self.encoded[key] = self._encode_column(key)
+            else:
+                self.encoded[key] = self._encode_records(key)
+        return self.encoded[key]
+
+    def _encode_records(self, key):
+        lookup = {}
+        if key == 'year':
+            date = getter(self.data, 'date')
+            values = (date(point).year if date(point) else None for point in self.data)
+        else:
+            values = map(getter(self.data, key), self.data)
+        codes = np.fromiter((lookup.setdefault(value, len(lookup)) for value in values),
+                            dtype=np.int64, count=len(self.data))
+        return codes, list(lookup)
+
+    def _encode_column(self, key):
+        column = self.data['date' if key == 'year' else key]
+        if isinstance(column, Categorical):
+            return _first_appearance(np.asarray(column.codes, dtype=np.int64), column.categories)
+        if isinstance(column, Text):
+            values = np.array(list(column), dtype=object)
+        elif key == 'year':
+            values = column.astype('datetime64[Y]').astype(np.int64) + 1970
+            # NaT is the smallest int64 whatever the unit, np.isnat needs a newer numpy than requirements.txt pins
+            values = np.where(column.view(np.int64) == np.iinfo(np.int64).min, -1, values)
+        else:
+            values = np.asarray(column)
+        categories, codes = np.unique(values, return_inverse=True)
+        categories = [None if key == 'year' and i == -1 else i for i in categories.tolist()]
+        return _first_appearance(codes.astype(np.int64), categories)
+
+    def counts(self, key):
+        codes, categories = self.encode(key)
+        counts = np.bincount(codes, minlength=len(categories))
+        return OrderedDict(zip(categories, counts.tolist()))
+
+    def grouped_matrix(self, key, group_by):
+        # 2-D histogram of group x key in one bincount over combined codes
+        codes, categories = self.encode(key)
+        groups, group_categories = self.encode(group_by)
+        combined = groups * len(categories) + codes
+        matrix = np.bincount(combined, minlength=len(group_categories) * len(categories))
+        return matrix.reshape(len(group_categories), len(categories)), group_categories, categories
+
+    def grouped_counts(self, key, group_by):
+        matrix, groups, categories = self.grouped_matrix(key, group_by)
+        return OrderedDict(
+            (group, OrderedDict(zip(categories, row))) for group, row in zip(groups, matrix.tolist())
+        )
+
+    def percentages(self, key, group_by=None):
+        if group_by is None:
+            counts = self.counts(key)
+            total = sum(counts.values())
+            return OrderedDict((k, (v / total) * 100 if v else 0) for k, v in counts.items())
+        matrix, groups, categories = self.grouped_matrix(key, group_by)
+        totals = matrix.sum(axis=1, keepdims=True)
+        percentages = np.divide(matrix * 100, totals, out=np.zeros(matrix.shape), where=totals > 0)
+        return OrderedDict(
+            (group, OrderedDict(zip(categories, row))) for group, row in zip(groups, percentages.tolist())
+        )
+
+
+class RunningAggregator:
+    # Incrementally maintained counts for a streaming pipeline. Memory is bounded by the number of
+    # categories, not records. Offers the same counts/grouped_counts/percentages as Aggregator
+    def __init__(self):
+        self.totals = {}
+        self.groups = {}
+        self.records = 0
+
+    def _value(self, point, key):
+        if key == 'year':
+            return point['date'].year if point['date'] else None
+        return point[key]
+
+    def track(self, key, group_by=None):
+        if group_by is None:
+            self.totals.setdefault(key, OrderedDict())
+        else:
+            self.groups.setdefault((key, group_by), OrderedDict())
+        return self
+
+    def add(self, point, sign=1):
+        self.records += sign
+        for key, counts in self.totals.items():
+            value = self._value(point, key)
+            counts[value] = counts.get(value, 0) + sign
+        for (key, group_by), groups in self.groups.items():
+            value = self._value(point, key)
+            inner = groups.setdefault(self._value(point, group_by), OrderedDict())
+            inner[value] = inner.get(value, 0) + sign
+
+    def update(self, kept, superseded=None):
+        # A re-rated statement moves from its old categories to its new ones
+        if superseded is not None:
+            self.add(superseded, -1)
+        self.add(kept)
+
+    def __len__(self):
+        return self.records
+
+    def counts(self, key):
+        return OrderedDict(self.totals[key])
+
+    def grouped_counts(self, key, group_by):
+        groups = self.groups[(key, group_by)]
+        values = OrderedDict((value, 0) for inner in groups.values() for value in inner)
+        return OrderedDict(
+            (group, OrderedDict((value, inner.get(value, 0)) for value in values)) for group, inner in groups.items()
+        )
+
+    def percentages(self, key, group_by=None):
+        if group_by is None:
+            counts = self.counts(key)
+            total = sum(counts.values())
+            return OrderedDict((k, (v / total) * 100 if v else 0) for k, v in counts.items())
+        percentages = OrderedDict()
+        for group, inner in self.grouped_counts(key, group_by).items():
+            total = sum(inner.values())
+            percentages[group] = OrderedDict((k, (v / total) * 100 if v else 0) for k, v in inner.items())
+        return percentages
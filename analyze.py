@@ -1,21 +1,37 @@
+import argparse
 import pickle
-import shutil
-import os
 import subprocess
 
-from matplotlib import pyplot
-from collections import defaultdict, OrderedDict
-import numpy as np
+from collections import OrderedDict
+
+import columnar
+import statement
+from aggregate import Aggregator
+from charts import ChartCache
+from metrics import Metrics
 
 DATA_PATH = 'data/cleaned.pickle'
+RATING_ORDER = ['pants on fire!', 'false', 'mostly false', 'half-true', 'mostly true', 'true', 'full flop',
+                'half flip', 'no flip']
 
 
 class Analyze:
-    def __init__(self, serializer, data_path, charts_path='charts', html_path='index.html'):
+    def __init__(self, serializer, data_path, charts_path='charts', html_path='index.html',
+                 columns=('rating', 'affiliation'), mmap=False, workers=None, aggregator=None, metrics=None):
         self.serializer = serializer
+        self.metrics = metrics or Metrics()
         self.data_path = data_path
-        self.data = self.serializer.load(open(data_path, 'rb'))
-        self.plot_count = 0
+        # Columnar datasets only read the columns the charts use
+        if aggregator is not None:
+            # Counts maintained elsewhere, e.g. by the streaming pipeline
+            self.data = None
+            self.aggregator = aggregator
+        elif columnar.is_columnar(data_path):
+            self.data = columnar.load(data_path, columns, mmap)
+            self.aggregator = Aggregator(self.data)
+        else:
+            self.data = statement.load(self.serializer, data_path)
+            self.aggregator = Aggregator(self.data)
         self.bar_plot_config = {
             'color': '#539caf',
             'align': 'center',
@@ -27,129 +43,84 @@ class Analyze:
         self.charts_path = charts_path
         self.html_path = html_path
         self.web_title = 'Politifact Analysis'
-        shutil.rmtree(charts_path, ignore_errors=True)
-        os.mkdir(charts_path)
+        # Charts are kept between runs, only those whose spec or data changed are re-rendered
+        self.cache = ChartCache(charts_path, workers)
 
-    def build_charts(self):
-        self._barchart(x='rating', title='Total Rating Counts', xlabel='Ratings', ylabel='Counts')
-        self._barchart(
-            group_by='affiliation',
-            x='rating',
-            title='Rating by Affiliation',
-            xlabel='Ratings',
-            ylabel='Counts'
-        )
-        self._barchart(
-            group_by='affiliation',
-            x='rating',
-            percentage=True,
-            title='Rating % by Affiliation',
-            xlabel='Ratings',
-            ylabel='Percentage'
-        )
-        self._write_html()
-        self._open_html()
-        # pyplot.show()
+    def build_charts(self, open_html=True):
+        with self.metrics.stage('charts'):
+            with self.metrics.stage('aggregate'):
+                charts = [self._barchart(x='rating', title='Total Rating Counts', xlabel='Ratings', ylabel='Counts')]
+                charts.append(self._barchart(
+                    group_by='affiliation',
+                    x='rating',
+                    title='Rating by Affiliation',
+                    xlabel='Ratings',
+                    ylabel='Counts'
+                ))
+                charts.append(self._barchart(
+                    group_by='affiliation',
+                    x='rating',
+                    percentage=True,
+                    title='Rating % by Affiliation',
+                    xlabel='Ratings',
+                    ylabel='Percentage'
+                ))
+            with self.metrics.stage('render'):
+                paths = self.cache.build(charts)
+            print(self.cache.rendered, 'of', len(charts), 'charts rendered')
+            self.metrics.count('charts', len(charts))
+            self.metrics.count('charts_rendered', self.cache.rendered)
+            self._write_html(paths)
+        if open_html:
+            self._open_html()
 
     def _barchart(self, group_by=None, x=None, percentage=False, title='Default', xlabel='Default', ylabel='Default'):
-        ax = self._new_plot()
+        # Only the aggregates are computed here, drawing happens in charts.render
         if not group_by:
-            counts = self._get_data(x, count=True)
-            ax.bar(list(counts.keys()), list(counts.values()), **self.bar_plot_config)
-            ax.set_xticklabels(list(counts.keys()), rotation=45, fontsize=8)
-            ax.set_ylabel(ylabel)
-            ax.set_xlabel(xlabel)
-            ax.set_title(title)
+            counts = self._get_data(x, count=not percentage, percentage=percentage)
+            data = list(counts.items())
         else:
-            # Total width for all bars at one x location
-            total_width = 0.9
-            # Width of each individual bar
-            x_data = self._get_data(x, group_by, count=True)
-            groups = list(x_data.keys())
-            ind_width = total_width / len(groups)
-            # This centers each cluster of bars about the x tick mark
-            alteration = np.arange(
-                -(total_width / len(groups)),
-                (total_width / len(groups)) + (ind_width / 2),
-                ind_width
-            )
-            colors = ['#FF0000', '#0000FF', '#00FF00']
-
-            # Draw bars, one category at a time
-            for i in range(0, len(groups)):
-                # Move the bar to the right on the x-axis so it doesn't
-                # overlap with previously drawn ones
-                if percentage:
-                    total = sum(x_data[groups[i]].values())
-                    data = [((i / total) * 100 if i else 0) for i in list(x_data[groups[i]].values())]
-                else:
-                    data = list(x_data[groups[i]].values())
-                ax.bar(
-                    range(len(list(x_data[groups[i]].keys()))) + alteration[i],
-                    data,
-                    color=colors[i],
-                    label=groups[i],
-                    width=ind_width
-                )
-            ax.set_xticks(list(np.arange(0, len(list(x_data[groups[i]].keys())), 1)))
-            ax.set_xticklabels(list(x_data[groups[i]].keys()), rotation=45, fontsize=8)
-            ax.set_ylabel(ylabel)
-            ax.set_xlabel(xlabel)
-            ax.set_title(title)
-            ax.legend(loc='upper right')
-        self._save_figure()
-
-    def _save_figure(self):
-        title = pyplot.gcf().gca().title.get_text().lower().replace(' ', '_') + '.png'
-        pyplot.savefig(os.path.join(self.charts_path, title))
-
-    def _new_plot(self):
-        fig = pyplot.figure(self.plot_count)
-        fig.subplots_adjust(**self.plot_figure_margins)
-        ax = fig.add_subplot(111)
-        self.plot_count += 1
-        return ax
+            x_data = self._get_data(x, group_by, count=not percentage, percentage=percentage)
+            data = [(group, list(values.items())) for group, values in x_data.items()]
+        return {
+            'name': title.lower().replace(' ', '_') + '.png',
+            'group_by': group_by,
+            'data': data,
+            'title': title,
+            'xlabel': xlabel,
+            'ylabel': ylabel,
+            'style': self.bar_plot_config,
+            'margins': self.plot_figure_margins
+        }
 
-    def _get_data(self, key, group_by=None, count=False):
+    def _get_data(self, key, group_by=None, count=False, percentage=False):
         if key is not None:
-            if count:
+            if percentage:
+                counts = self.aggregator.percentages(key, group_by)
+            elif count:
                 if not group_by:
-                    counts = defaultdict(int)
-                    for point in self.data:
-                        counts[point[key]] += 1
+                    counts = self.aggregator.counts(key)
                 else:
-                    group_bys = list(self._get_data(group_by, count=True).keys())
-                    counts = {k: defaultdict(int) for k in group_bys}
-                    for point in self.data:
-                        counts[point[group_by]][point[key]] += 1
-                        for other in counts.values():
-                            if point[key] not in other:
-                                other[point[key]] = 0
-                counts = self._order_data(counts, key, 'rating', group_by)
-                return counts
+                    counts = self.aggregator.grouped_counts(key, group_by)
+            else:
+                return None
+            counts = self._order_data(counts, key, 'rating', group_by)
+            return counts
 
     def _order_data(self, data, key, order_by, group_by=None):
         if group_by is not None:
             final = OrderedDict()
             for group, inner_data in data.items():
-                final[group] = OrderedDict()
-                if order_by == 'rating':
-                    final[group]['pants on fire!'] = inner_data['pants on fire!']
-                    final[group]['false'] = inner_data['false']
-                    final[group]['mostly false'] = inner_data['mostly false']
-                    final[group]['half-true'] = inner_data['half-true']
-                    final[group]['mostly true'] = inner_data['mostly true']
-                    final[group]['true'] = inner_data['true']
-                    final[group]['full flop'] = inner_data['full flop']
-                    final[group]['half flip'] = inner_data['half flip']
-                    final[group]['no flip'] = inner_data['no flip']
+                if order_by == 'rating' and key == 'rating':
+                    final[group] = OrderedDict((rating, inner_data.get(rating, 0)) for rating in RATING_ORDER)
+                else:
+                    final[group] = inner_data
             return final
         return data
 
-    def _write_html(self):
+    def _write_html(self, paths):
         html_file = f"<!doctype html><html><head><title>{self.web_title}</title></head><body>"
-        for image in os.listdir(self.charts_path):
-            full_path = os.path.join(self.charts_path, image)
+        for full_path in paths:
             div = f"<div id='{full_path}'><img src='{full_path}'></div>"
             html_file += div + '<br>'
         html_file += "</body></html>"
@@ -159,5 +130,16 @@ class Analyze:
     def _open_html(self):
         subprocess.Popen(["open", self.html_path])
 
-a = Analyze(serializer=pickle, data_path=DATA_PATH)
-a.build_charts()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render charts of the cleaned statements')
+    parser.add_argument('--data', default=DATA_PATH, help='cleaned.pickle or a columnar directory')
+    parser.add_argument('--workers', type=int, default=None, help='processes used to render changed charts')
+    parser.add_argument('--metrics', help='write a JSON report of stage timings and counters here')
+    parser.add_argument('--profile', action='store_true', help='run stages under cProfile, needs --metrics')
+    args = parser.parse_args()
+    metrics = Metrics(enabled=bool(args.metrics), profile=args.profile)
+    with metrics.stage('load'):
+        a = Analyze(serializer=pickle, data_path=args.data, workers=args.workers, metrics=metrics)
+    a.build_charts()
+    metrics.write(args.metrics)
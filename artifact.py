@@ -0,0 +1,97 @@
+import hashlib
+import json
+import zipfile
+
+import numpy as np
+
+from naive_bayes import MODELS
+from vectorize import Vectorizer
+
+VERSION = 1
+
+
+def data_hash(texts, labels):
+    # Identifies the training data an artifact was built from
+    digest = hashlib.sha256()
+    for text, label in zip(texts, labels):
+        digest.update(text.encode('utf-8') + b'\x1f' + label.encode('utf-8') + b'\x1e')
+    return digest.hexdigest()
+
+
+def save(path, vectorizer, classifier, model, alpha, training_hash):
+    terms = sorted(vectorizer.vocabulary, key=vectorizer.vocabulary.get)
+    encoded = [term.encode('utf-8') for term in terms]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(term) for term in encoded], out=offsets[1:])
+    meta = {
+        'version': VERSION,
+        'model': model,
+        'alpha': alpha,
+        'ngram_range': list(vectorizer.ngram_range),
+        'binary': vectorizer.binary,
+        'data_hash': training_hash
+    }
+    arrays = {
+        'meta': np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8),
+        'classes': np.asarray(classifier.classes, dtype=str),
+        'class_log_prior': classifier.class_log_prior,
+        'feature_log_prob': classifier.feature_log_prob,
+        'vocabulary_offsets': offsets,
+        'vocabulary_data': np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    }
+    if hasattr(classifier, 'feature_log_neg_prob'):
+        arrays['feature_log_neg_prob'] = classifier.feature_log_neg_prob
+    # Uncompressed so every member can be memory-mapped straight out of the archive
+    np.savez(path, **arrays)
+
+
+def _mmap_npz(path):
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as file:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f'{path} member {info.filename} is compressed and cannot be memory-mapped')
+            # Local file header: 30 fixed bytes, then the name and extra field
+            file.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(file.read(4), dtype='<u2')
+            file.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(file)
+            if version == (1, 0):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(file)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(file)
+            arrays[info.filename[:-len('.npy')]] = np.memmap(
+                path, dtype=dtype, mode='r', offset=file.tell(), shape=shape, order='F' if fortran else 'C'
+            )
+    return arrays
+
+
+class Model:
+    # A trained rating classifier loaded from an artifact, needs only numpy
+    def __init__(self, path, mmap=True):
+        if mmap:
+            arrays = _mmap_npz(path)
+        else:
+            arrays = dict(np.load(path))
+        self.meta = json.loads(bytes(arrays['meta']).decode('utf-8'))
+        if self.meta['version'] != VERSION:
+            raise ValueError(f"Unsupported model version {self.meta['version']} in {path}")
+        self.vectorizer = Vectorizer(tuple(self.meta['ngram_range']), binary=self.meta['binary'])
+        data = bytes(arrays['vocabulary_data'])
+        offsets = arrays['vocabulary_offsets'].tolist()
+        self.vectorizer.vocabulary = {
+            data[start:end].decode('utf-8'): index for index, (start, end) in enumerate(zip(offsets, offsets[1:]))
+        }
+        self.classifier = MODELS[self.meta['model']](self.meta['alpha'])
+        self.classifier.classes = np.asarray(arrays['classes'])
+        self.classifier.class_log_prior = arrays['class_log_prior']
+        self.classifier.feature_log_prob = arrays['feature_log_prob']
+        if 'feature_log_neg_prob' in arrays:
+            self.classifier.feature_log_neg_prob = arrays['feature_log_neg_prob']
+
+    def score_batch(self, texts):
+        return self.classifier.classes, self.classifier.predict_proba(self.vectorizer.transform(texts))
+
+    def predict_batch(self, texts):
+        classes, scores = self.score_batch(texts)
+        return classes[np.argmax(scores, axis=1)]
@@ -0,0 +1,55 @@
+import argparse
+import pickle
+import tempfile
+import time
+from collections import defaultdict
+
+import columnar
+from aggregate import Aggregator
+
+
+def legacy_grouped_counts(data, key, group_by):
+    # The pre-aggregator Analyze._get_data loop. O(records x groups)
+    group_bys = defaultdict(int)
+    for point in data:
+        group_bys[point[group_by]] += 1
+    counts = {k: defaultdict(int) for k in group_bys}
+    for point in data:
+        counts[point[group_by]][point[key]] += 1
+        for other in counts.values():
+            if point[key] not in other:
+                other[point[key]] = 0
+    return counts
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Grouped rating counts: legacy loops vs Aggregator')
+    parser.add_argument('--data', default='data/cleaned.pickle')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--group-by', default='affiliation')
+    args = parser.parse_args()
+
+    base = pickle.load(open(args.data, 'rb'))
+    print(f"{'size':>10} {'legacy (s)':>11} {'records (s)':>12} {'columnar (s)':>13} {'recount (ms)':>13}")
+    for size in args.sizes:
+        data = (base * (size // len(base) + 1))[:size]
+        legacy, expected = timed(legacy_grouped_counts, data, 'rating', args.group_by)
+        records, result = timed(Aggregator(data).grouped_counts, 'rating', args.group_by)
+        assert {g: dict(v) for g, v in result.items()} == {g: dict(v) for g, v in expected.items()}
+        with tempfile.TemporaryDirectory() as directory:
+            columnar.dump(data, directory)
+            aggregator = Aggregator(columnar.load(directory, ['rating', args.group_by]))
+            encoded, _ = timed(aggregator.grouped_counts, 'rating', args.group_by)
+            # Once encoded, further charts over the same columns only pay for the bincount
+            recount, _ = timed(aggregator.percentages, 'rating', args.group_by)
+        print(f'{size:>10} {legacy:>11.2f} {records:>12.2f} {encoded:>13.3f} {recount * 1000:>13.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+import argparse
+import copy
+import os
+import time
+
+from benchmarks.synthetic import raw_crawl
+from clean import Clean
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scaling of sharded Clean.clean_parallel from 1 to N workers')
+    parser.add_argument('--size', type=int, default=1000000)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    raw = raw_crawl(args.size, duplicate_rate=0.1)
+    clean = Clean(serializer=None, raw_path=None, raw=copy.deepcopy(raw))
+    start = time.perf_counter()
+    expected = clean.clean()
+    serial = time.perf_counter() - start
+    print(f'{os.cpu_count()} cpus available')
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8}")
+    print(f"{'serial':>8} {serial:>9.2f} {1:>8.2f}")
+    for workers in args.workers:
+        clean = Clean(serializer=None, raw_path=None, raw=copy.deepcopy(raw))
+        start = time.perf_counter()
+        cleaned = clean.clean_parallel(workers)
+        elapsed = time.perf_counter() - start
+        assert cleaned == expected
+        print(f'{workers:>8} {elapsed:>9.2f} {serial / elapsed:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
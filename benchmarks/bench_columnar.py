@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+
+import columnar
+
+# Each case runs in a fresh interpreter so the RSS growth reflects only that load (linux /proc)
+CASE = '''
+import json, pickle, sys, time
+import columnar
+
+def rss_kb():
+    with open('/proc/self/status') as status:
+        return next(int(line.split()[1]) for line in status if line.startswith('VmRSS'))
+
+path, columns, mmap = sys.argv[1], json.loads(sys.argv[2]), sys.argv[3] == '1'
+before = rss_kb()
+start = time.perf_counter()
+if columnar.is_columnar(path):
+    table = columnar.load(path, columns, mmap)
+    # Touch every requested column so mmap pages are actually read
+    data = [sum(1 for _ in table[column]) for column in table]
+else:
+    data = pickle.load(open(path, 'rb'))
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'rss_kb': rss_kb() - before}))
+'''
+
+
+def run(path, columns=None, mmap=False):
+    output = subprocess.check_output(
+        [sys.executable, '-c', CASE, path, json.dumps(columns), '1' if mmap else '0'],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load time and RSS of cleaned.pickle vs the columnar format')
+    parser.add_argument('--data', default='data/cleaned.pickle')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        columnar.dump(pickle.load(open(args.data, 'rb')), directory)
+        cases = [
+            ('pickle, all columns', args.data, None, False),
+            ('columnar, all columns', directory, None, False),
+            ('columnar, rating+affiliation', directory, ['rating', 'affiliation'], False),
+            ('columnar, rating+affiliation mmap', directory, ['rating', 'affiliation'], True),
+            ('columnar, text+rating', directory, ['text', 'rating'], False),
+        ]
+        print(f"{'case':>36} {'load (ms)':>10} {'rss (MB)':>10}")
+        for name, path, columns, mmap in cases:
+            result = run(path, columns, mmap)
+            print(f"{name:>36} {result['seconds'] * 1000:>10.1f} {result['rss_kb'] / 1024:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import os
+import pickle
+import tempfile
+import time
+
+from crawl import ParallelCrawler
+from fixtures.server import serve
+from metrics import Metrics
+from pagecache import PageCache
+
+
+def crawl(root, directory, name, path='pages', **options):
+    metrics = Metrics(enabled=True)
+    cache = PageCache(os.path.join(directory, path), metrics=metrics, **options)
+    crawler = ParallelCrawler(pickle, workers=4, root=root, checkpoint_path=os.path.join(directory, name + '.jsonl'),
+                              metrics=metrics, cache=cache)
+    crawler.links_path = os.path.join(directory, 'links.pickle')
+    crawler.results_path = os.path.join(directory, 'results.pickle')
+    start = time.perf_counter()
+    results = crawler.collect()
+    elapsed = time.perf_counter() - start
+    return results, elapsed, metrics.report()['stages']['crawl']['counts']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-crawling the fixture site through the page cache')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    server, base = serve()
+    with tempfile.TemporaryDirectory() as directory:
+        timings = {}
+        counts = {}
+        expected = None
+        for index in range(args.repeat):
+            # Every repeat starts from a new cache directory, so the cold run downloads every page
+            for name, options in [('cold', {}), ('fresh', {}), ('revalidate', {'ttl': 0})]:
+                results, elapsed, counts[name] = crawl(base + 'personalities/', directory, f'{name}-{index}',
+                                                       f'pages-{index}', **options)
+                timings.setdefault(name, []).append(elapsed)
+                expected = expected or results
+                assert results == expected
+        # Replays the first repeat's cache once the site is gone
+        server.shutdown()
+        server.server_close()
+        results, elapsed, counts['offline'] = crawl(base + 'personalities/', directory, 'offline', 'pages-0',
+                                                    offline=True)
+        timings['offline'] = [elapsed]
+        assert results == expected
+    print(f"{'run':>11} {'best ms':>8}  cache")
+    for name in timings:
+        cache = {key: value for key, value in counts[name].items() if key.startswith('cache_')}
+        print(f'{name:>11} {min(timings[name]) * 1000:>8.1f}  {cache}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import argparse
+import datetime
+import time
+
+from benchmarks.synthetic import raw_statements
+from dates import DateParser
+
+
+def legacy_format_date(date):
+    # The pre-DateParser Clean._format_date loop
+    suffixes = ['st', 'nd', 'rd', 'th']
+    for suffix in suffixes:
+        try:
+            return datetime.datetime.strptime(date, f'on %A, %B %d{suffix}, %Y')
+        except ValueError:
+            pass
+
+
+def timed(function, dates):
+    start = time.perf_counter()
+    parsed = [function(date) for date in dates]
+    return time.perf_counter() - start, parsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Date parsing throughput: strptime loop vs DateParser')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'strptime (/s)':>14} {'regex (/s)':>12} {'regex+lru (/s)':>15} {'distinct':>9}")
+    for size in args.sizes:
+        dates = [statement['date'] for statement in raw_statements(size, duplicate_rate=0)]
+        legacy, expected = timed(legacy_format_date, dates)
+        uncached, _ = timed(DateParser(cache_size=0), dates)
+        cached, parsed = timed(DateParser(), dates)
+        assert parsed == expected
+        print(f'{size:>10} {size / legacy:>14.0f} {size / uncached:>12.0f} {size / cached:>15.0f} {len(set(dates)):>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import copy
+import datetime
+import time
+
+from benchmarks.synthetic import raw_crawl
+from clean import Clean
+
+
+def legacy_clean(clean):
+    # The pre-index Clean.clean loop, kept here as the comparison baseline. O(n^2)
+    flat = [dict(i) for point in clean.raw for i in point]
+    cleaned = []
+    for count, point in enumerate(flat):
+        point['date'] = clean._format_date(point['date'])
+        point['edition'] = clean._format_edition(point['edition'])
+        point['rating'] = clean._format_rating(point['rating'])
+        duplicate = None
+        for other in cleaned:
+            if point['text'] == other['text'] and point['source'] == other['source']:
+                duplicate = other
+                break
+        if not duplicate:
+            cleaned.append({**point, **{'id': count}})
+        else:
+            actual = point if point['date'] - duplicate['date'] > datetime.timedelta(0) else duplicate
+            if 'id' not in actual:
+                cleaned.append({**actual, **{'id': duplicate['id']}})
+    return cleaned
+
+
+def indexed_clean(clean):
+    clean.raw = [[copy.copy(i) for i in point] for point in clean.raw]
+    return clean.clean()
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare indexed and legacy deduplication in Clean.clean')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--legacy-limit', type=int, default=10000,
+                        help='largest size the O(n^2) legacy path is actually run at')
+    parser.add_argument('--duplicate-rate', type=float, default=0.1)
+    args = parser.parse_args()
+
+    legacy_rate = None
+    print(f"{'size':>10} {'indexed (s)':>12} {'hashed (s)':>12} {'legacy (s)':>14} {'speedup':>10}")
+    for size in args.sizes:
+        raw = raw_crawl(size, args.duplicate_rate)
+        indexed, _ = timed(indexed_clean, Clean(serializer=None, raw_path=None, raw=raw))
+        hashed, _ = timed(indexed_clean, Clean(serializer=None, raw_path=None, raw=raw, hashed=True))
+        if size <= args.legacy_limit:
+            legacy, _ = timed(legacy_clean, Clean(serializer=None, raw_path=None, raw=raw))
+            legacy_rate = legacy / size ** 2
+            legacy_label = f'{legacy:.2f}'
+        elif legacy_rate is not None:
+            # Extrapolated from the largest measured run, the legacy scan is quadratic
+            legacy = legacy_rate * size ** 2
+            legacy_label = f'~{legacy:.0f} est'
+        else:
+            legacy, legacy_label = None, 'skipped'
+        speedup = f'{legacy / indexed:.0f}x' if legacy else '-'
+        print(f'{size:>10} {indexed:>12.2f} {hashed:>12.2f} {legacy_label:>14} {speedup:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+import argparse
+import glob
+import os
+import pickle
+import tempfile
+import time
+
+from extract import Extractor
+from fixtures.server import SITE_PATH
+
+
+def fixture_pages():
+    return sorted(glob.glob(os.path.join(SITE_PATH, 'personalities', '*', 'statements', 'by', '*.html')))
+
+
+def bench_lxml(pages, seconds):
+    extractor = Extractor()
+    sources = [(open(page).read(), 'file://' + page) for page in pages]
+    parsed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for source, url in sources:
+            parsed += len(extractor.get_statements(extractor.parse(source), url))
+    return parsed / (time.perf_counter() - start)
+
+
+def bench_browser(pages, seconds, extraction):
+    # Needs firefox and geckodriver, both paths read from the same loaded page
+    from crawl import Crawler
+    with tempfile.TemporaryDirectory() as directory:
+        crawler = Crawler(
+            serializer=pickle,
+            checkpoint_path=os.path.join(directory, 'crawl.jsonl'),
+            extraction=extraction,
+            root='file://' + pages[0]
+        )
+        try:
+            parsed = 0
+            elapsed = 0
+            while elapsed < seconds:
+                for page in pages:
+                    crawler._safe_get('file://' + page)
+                    start = time.perf_counter()
+                    parsed += sum(1 for _ in crawler.visit_page())
+                    elapsed += time.perf_counter() - start
+            return parsed / elapsed
+        finally:
+            crawler.driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Statements/sec for selenium element lookups vs lxml extraction')
+    parser.add_argument('--seconds', type=float, default=2)
+    args = parser.parse_args()
+
+    pages = fixture_pages()
+    print(f"{'path':>28} {'statements/sec':>16}")
+    print(f"{'lxml (http or page source)':>28} {bench_lxml(pages, args.seconds):>16.0f}")
+    for extraction in ('page_source', 'elements'):
+        try:
+            rate = f'{bench_browser(pages, args.seconds, extraction):.0f}'
+        except Exception as e:
+            rate = f'skipped ({type(e).__name__})'
+        print(f"{'selenium ' + extraction:>28} {rate:>16}")
+
+
+if __name__ == '__main__':
+    main()
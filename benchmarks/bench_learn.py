@@ -0,0 +1,40 @@
+import argparse
+import pickle
+import time
+
+from learn import Bayesian, DATA_PATH
+
+CONFIGURATIONS = [
+    ('nltk per-word', {'engine': 'nltk'}),
+    ('multinomial 1-gram', {'engine': 'vectorized', 'model': 'multinomial'}),
+    ('multinomial 1-2 gram', {'engine': 'vectorized', 'model': 'multinomial', 'ngram_range': (1, 2)}),
+    ('bernoulli 1-gram', {'engine': 'vectorized', 'model': 'bernoulli'}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rating classifier training: NLTK vs vectorized Naive Bayes')
+    parser.add_argument('--data', default=DATA_PATH)
+    args = parser.parse_args()
+
+    # _get_training_set is deterministic, so every configuration sees the same split
+    b = Bayesian(serializer=pickle, data_path=args.data)
+    start = time.perf_counter()
+    b.quoted_data = b._get_quote_data()
+    b._get_training_set()
+    prepared = time.perf_counter() - start
+    print(f'quote extraction and split, included in every train time: {prepared * 1000:.1f} ms')
+    print(f"{'configuration':>22} {'train (ms)':>11} {'test (ms)':>10} {'accuracy':>9}")
+    for name, options in CONFIGURATIONS:
+        start = time.perf_counter()
+        b.train_ratings(**options)
+        trained = time.perf_counter() - start
+        start = time.perf_counter()
+        result = b.test()
+        tested = time.perf_counter() - start
+        accuracy = result['correct'] / (result['correct'] + result['incorrect'])
+        print(f'{name:>22} {trained * 1000:>11.1f} {tested * 1000:>10.1f} {accuracy:>9.3f}')
+
+
+if __name__ == '__main__':
+    main()
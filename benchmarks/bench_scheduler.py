@@ -0,0 +1,78 @@
+import argparse
+import os
+import pickle
+import tempfile
+import time
+
+from crawl import ParallelCrawler
+from fixtures.server import Faults, serve
+from metrics import Metrics
+
+
+def crawl(directory, name, faults, port=0, **options):
+    # Returns the port as well, a resumed crawl has to find the site where its journal says it is
+    server, base = serve(port, faults=faults)
+    metrics = Metrics(enabled=True)
+    crawler = ParallelCrawler(pickle, workers=4, root=base + 'personalities/', metrics=metrics,
+                              checkpoint_path=os.path.join(directory, name + '.jsonl'), **options)
+    crawler.links_path = os.path.join(directory, 'links.pickle')
+    crawler.results_path = os.path.join(directory, 'results.pickle')
+    try:
+        start = time.perf_counter()
+        results = crawler.collect()
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results, elapsed, metrics.report()['stages']['crawl']['counts'], server.server_address[1]
+
+
+def min_gap(faults):
+    # Between fetches, the second request of a `statements/by` -> `statements/by/` redirect is the same fetch
+    starts = [start for start, path in faults.requests if not path.endswith('/by/')]
+    gaps = [later - earlier for earlier, later in zip(starts, starts[1:])]
+    return min(gaps) if gaps else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl scheduler against the fixture server with injected faults')
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.3)
+    parser.add_argument('--rate', type=float, default=20, help='requests a second for the rate limited run')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        expected = crawl(directory, 'expected', None)[0]
+        broken = 'john-roe/statements/by/?page=2'
+        runs = [
+            ('clean', Faults(args.latency, seed=args.seed), {}),
+            ('flaky', Faults(args.latency, args.latency, args.error_rate, seed=args.seed),
+             {'retries': 8, 'backoff': 0.02}),
+            ('retry-after', Faults(args.latency, error_rate=args.error_rate, retry_after=0.1, seed=args.seed),
+             {'retries': 8, 'backoff': 0.01}),
+            ('rate', Faults(args.latency, seed=args.seed), {'rate': args.rate}),
+            ('per-host', Faults(args.latency * 5, seed=args.seed), {'per_host': 2}),
+            ('broken', Faults(args.latency, broken=[broken], seed=args.seed), {'retries': 2, 'backoff': 0.01}),
+            # The same journal and site as 'broken' once the page is back, resuming from the dead-lettered page
+            ('resumed', Faults(args.latency, seed=args.seed), {'retries': 2, 'backoff': 0.01})
+        ]
+        print(f"{'run':>12} {'seconds':>8} {'statements':>11} {'attempts':>9} {'retries':>8} {'dead':>5} "
+              f"{'peak':>5} {'min gap':>8}")
+        port = 0
+        for name, faults, options in runs:
+            journal = 'broken' if name == 'resumed' else name
+            results, elapsed, counts, port = crawl(directory, journal, faults, port if name == 'resumed' else 0,
+                                                   **options)
+            if name not in ('broken', 'resumed'):
+                assert results == expected, name
+            gap = min_gap(faults)
+            print(f"{name:>12} {elapsed:>8.2f} {len(results):>5}/{len(expected):<5} "
+                  f"{counts.get('fetch_attempts', 0):>9} {counts.get('retries', 0):>8} "
+                  f"{counts.get('dead_letters', 0):>5} {faults.peak:>5} "
+                  f"{'-' if gap is None else f'{gap * 1000:.0f} ms':>8}")
+        assert results == expected, 'resumed'
+
+
+if __name__ == '__main__':
+    main()
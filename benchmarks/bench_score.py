@@ -0,0 +1,62 @@
+import argparse
+import os
+import pickle
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from learn import Bayesian, DATA_PATH
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATEMENT = '{"text": "\\"We cut taxes for 90 percent of families.\\""}\n'
+RETRAIN = '''
+import pickle, sys
+from learn import Bayesian
+b = Bayesian(serializer=pickle, data_path=sys.argv[1])
+b.train_ratings(engine='vectorized')
+print(b.predict_batch([sys.stdin.read()]))
+'''
+IMPORTS = '''
+import sys, score
+print(','.join(m for m in ('nltk', 'learn', 'columnar', 'matplotlib', 'selenium') if m in sys.modules) or 'none')
+'''
+
+
+def cold_start(command, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, input=STATEMENT, text=True, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold-start latency of score.py against retraining from data')
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ratings.npz')
+        b = Bayesian(serializer=pickle, data_path=args.data)
+        b.train_ratings(engine='vectorized')
+        b.save_model(path)
+
+        baseline = cold_start([sys.executable, '-c', 'pass'], args.runs)
+        print(f"{'case':>32} {'median (ms)':>12}")
+        print(f"{'bare interpreter':>32} {baseline * 1000:>12.1f}")
+        for name, command in [
+            ('score.py, mmap artifact', [sys.executable, 'score.py', path]),
+            ('score.py, read artifact', [sys.executable, 'score.py', path, '--no-mmap']),
+            ('load data and retrain', [sys.executable, '-c', RETRAIN, args.data]),
+        ]:
+            print(f'{name:>32} {cold_start(command, args.runs) * 1000:>12.1f}')
+        imported = subprocess.check_output([sys.executable, '-c', IMPORTS], cwd=ROOT, text=True).strip()
+        print('training stack modules imported by score.py:', imported)
+
+
+if __name__ == '__main__':
+    main()
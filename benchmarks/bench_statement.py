@@ -0,0 +1,45 @@
+import argparse
+import pickle
+import time
+import tracemalloc
+
+import statement
+
+
+def measure(function, *args):
+    # Held memory is traced on one call and the time taken on another, tracing slows the call down
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    start = time.perf_counter()
+    function(*args)
+    return result, current, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory held by cleaned statements as dicts vs Statement records')
+    parser.add_argument('--data', default='data/cleaned.pickle')
+    args = parser.parse_args()
+
+    with open(args.data, 'rb') as file:
+        raw = file.read()
+    dicts, dict_bytes, dict_time = measure(pickle.loads, raw)
+    # The compat loader turning dict era pickles into Statements, then a pickle written as Statements
+    converted, _, convert_time = measure(statement.convert, pickle.loads(raw))
+    written = pickle.dumps(converted)
+    statements, statement_bytes, statement_time = measure(pickle.loads, written)
+
+    print(len(dicts), 'statements from', args.data)
+    print(f"{'layout':>22} {'held (MB)':>10} {'per record (B)':>15} {'load (ms)':>10} {'pickle (MB)':>12}")
+    for name, held, elapsed, size in [('dict', dict_bytes, dict_time, len(raw)),
+                                      ('Statement', statement_bytes, statement_time, len(written))]:
+        print(f'{name:>22} {held / 2 ** 20:>10.2f} {held / len(dicts):>15.0f} {elapsed * 1000:>10.1f} '
+              f'{size / 2 ** 20:>12.2f}')
+    print(f'saved {1 - statement_bytes / dict_bytes:.0%}, dict pickles convert in {convert_time * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
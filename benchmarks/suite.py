@@ -0,0 +1,157 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import pickle
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from analyze import Analyze
+from benchmarks.synthetic import cleaned_statements, raw_crawl
+from clean import Clean
+from learn import Bayesian
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SCALES = [1000, 10000, 50000]
+# Timing differences below this many seconds are treated as noise whatever the tolerance says
+NOISE_SECONDS = 0.02
+
+
+# Each case is (setup, run, largest scale). setup builds fresh inputs outside the timed region,
+# run is the stage being measured
+def _clean_setup(scale, directory):
+    return Clean(serializer=None, raw_path=None, raw=raw_crawl(scale, seed=scale))
+
+
+def _clean_run(clean):
+    clean.clean()
+
+
+def _cleaned_path(scale, directory):
+    path = os.path.join(directory, f'cleaned-{scale}.pickle')
+    if not os.path.exists(path):
+        with open(path, 'wb') as file:
+            pickle.dump(cleaned_statements(scale, seed=scale), file)
+    return path
+
+
+def _analyze_setup(scale, directory):
+    return _cleaned_path(scale, directory), directory
+
+
+def _analyze_run(state):
+    path, directory = state
+    analyze = Analyze(serializer=pickle, data_path=path, charts_path=directory)
+    analyze._get_data('rating', count=True)
+    analyze._get_data('rating', 'affiliation', count=True)
+    analyze._get_data('rating', 'affiliation', percentage=True)
+
+
+def _train_setup(engine):
+    def setup(scale, directory):
+        return Bayesian(serializer=pickle, data_path=_cleaned_path(scale, directory), cache_dir=directory), engine
+    return setup
+
+
+def _train_run(state):
+    bayesian, engine = state
+    bayesian.train_ratings(engine=engine)
+    bayesian.test()
+
+
+CASES = {
+    'clean': (_clean_setup, _clean_run, None),
+    'analyze': (_analyze_setup, _analyze_run, None),
+    'train_vectorized': (_train_setup('vectorized'), _train_run, None),
+    # Per-word NLTK training is slow enough that the largest scale would dominate the suite
+    'train_nltk': (_train_setup('nltk'), _train_run, 10000),
+}
+
+
+def measure(case, scale, directory, repeat):
+    setup, run, _ = CASES[case]
+    times = []
+    # The stages print progress, which is noise here
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            state = setup(scale, directory)
+            # Like timeit, collection pauses are kept out of the timed region, they were most of the noise
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                run(state)
+                times.append(time.perf_counter() - start)
+            finally:
+                gc.enable()
+        # A separate run for memory, tracemalloc slows the code it traces
+        state = setup(scale, directory)
+        tracemalloc.start()
+        try:
+            run(state)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {'seconds': min(times), 'peak_kb': peak // 1024}
+
+
+def compare(result, baseline, tolerance):
+    # Regressions are results more than `tolerance` (a fraction) worse than the baseline
+    if baseline is None:
+        return 'new'
+    regressions = [metric for metric in ('seconds', 'peak_kb')
+                   if result[metric] > baseline[metric] * (1 + tolerance)]
+    if 'seconds' in regressions and result['seconds'] - baseline['seconds'] < NOISE_SECONDS:
+        regressions.remove('seconds')
+    return 'REGRESSION ' + ','.join(regressions) if regressions else 'ok'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time and memory of each stage on synthetic data, '
+                                                 'compared against a stored baseline')
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES)
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case, the fastest is reported')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown, 0.25 is 25%%')
+    parser.add_argument('--save', action='store_true', help='write these results as the new baseline')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+
+    results = {}
+    failed = False
+    print(f"{'case':>24} {'time (ms)':>10} {'base (ms)':>10} {'peak (MB)':>10} {'base (MB)':>10}  status")
+    with tempfile.TemporaryDirectory() as directory:
+        for case in args.cases:
+            for scale in args.scales:
+                if CASES[case][2] is not None and scale > CASES[case][2]:
+                    continue
+                name = f'{case}/{scale}'
+                result = results[name] = measure(case, scale, directory, args.repeat)
+                status = compare(result, baseline.get(name), args.tolerance)
+                failed = failed or status.startswith('REGRESSION')
+                base = baseline.get(name, {})
+                base_ms = f"{base['seconds'] * 1000:.1f}" if base else '-'
+                base_mb = f"{base['peak_kb'] / 1024:.1f}" if base else '-'
+                print(f"{name:>24} {result['seconds'] * 1000:>10.1f} {base_ms:>10} "
+                      f"{result['peak_kb'] / 1024:>10.1f} {base_mb:>10}  {status}")
+
+    if args.save:
+        with open(args.baseline, 'w') as file:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': {**baseline, **results}
+            }, file, indent=2, sort_keys=True)
+        print('baseline written to', args.baseline)
+    elif failed:
+        sys.exit(1)
@@ -0,0 +1,84 @@
+import datetime
+import random
+
+from statement import Statement
+
+# Weights roughly follow the bundled 2019 snapshot in data/cleaned.pickle
+RATINGS = {
+    'Pants on Fire!': 661, 'False': 1941, 'Mostly False': 1884, 'Half-True': 2249, 'Mostly True': 2195,
+    'True': 1750, 'Full Flop': 137, 'Half Flip': 58, 'No Flip': 25
+}
+AFFILIATIONS = {'republican': 5978, 'democrat': 4728, 'independent': 194}
+EDITIONS = {
+    'PolitiFact National': 3529, 'PolitiFact Florida': 1282, 'PolitiFact Texas': 1188,
+    'PolitiFact Wisconsin': 1035, 'PolitiFact Georgia': 573, 'PolitiFact Ohio': 560,
+    'PolitiFact Virginia': 513, 'PolitiFact New Jersey': 351
+}
+WORDS = ['tax', 'jobs', 'percent', 'health', 'care', 'budget', 'million', 'voted', 'against', 'state',
+         'federal', 'immigration', 'wall', 'crime', 'schools', 'increase', 'cut', 'billion', 'pay', 'law']
+# How many quoted fragments a statement's text carries, the classifier only reads those
+QUOTES = {0: 1311, 1: 8936, 2: 604, 3: 48}
+START = datetime.date(2007, 1, 1)
+
+
+def _suffix(day):
+    if day in (11, 12, 13):
+        return 'th'
+    return {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')
+
+
+def raw_date(date):
+    return f"on {date.strftime('%A, %B')} {date.day}{_suffix(date.day)}, {date.year}"
+
+
+def _pick(rng, weights):
+    return rng.choices(list(weights.keys()), weights=list(weights.values()))[0]
+
+
+def _text(rng, index):
+    # Plain and quoted fragments alternate like 'Says X "..." and "..."', the index keeps texts unique
+    quotes = _pick(rng, QUOTES)
+    words = [' '.join(rng.choices(WORDS, k=rng.randrange(3, 10))) for _ in range(quotes)]
+    if not quotes:
+        return f"Says {' '.join(rng.choices(WORDS, k=rng.randrange(6, 20)))} {index}."
+    fragments = [f'"{fragment}"' for fragment in words]
+    fragments[-1] = fragments[-1][:-1] + f' {index}."'
+    if rng.random() < 0.5:
+        return ' '.join(fragments)
+    return 'Says ' + ' and '.join(fragments)
+
+
+def raw_statements(size, duplicate_rate=0.1, seed=0):
+    # Statements in the shape the crawler emits, with `duplicate_rate` of them re-rated copies
+    rng = random.Random(seed)
+    unique = []
+    for index in range(size):
+        date = raw_date(START + datetime.timedelta(days=rng.randrange(4400)))
+        if unique and rng.random() < duplicate_rate:
+            statement = {**rng.choice(unique), **{'date': date}}
+        else:
+            source = index % max(size // 20, 1)
+            statement = {
+                'mugshot': f'https://static.politifact.com/politifact/mugs/{source}.jpg',
+                'source': f'SOURCE {source}',
+                'text': _text(rng, index),
+                'edition': '— ' + _pick(rng, EDITIONS),
+                'date': date,
+                'rating': _pick(rng, RATINGS),
+                'reason': ' '.join(rng.choices(WORDS, k=5)),
+                'affiliation': _pick(rng, AFFILIATIONS)
+            }
+            unique.append(statement)
+        yield Statement.from_dict(statement)
+
+
+def raw_crawl(size, duplicate_rate=0.1, per_personality=50, seed=0):
+    # Same nesting as data/results.pickle: one list of statements per personality
+    statements = list(raw_statements(size, duplicate_rate, seed))
+    return [statements[i:i + per_personality] for i in range(0, len(statements), per_personality)]
+
+
+def cleaned_statements(size, duplicate_rate=0.1, seed=0):
+    # Records as Clean writes them to data/cleaned.pickle, for benchmarks of the later stages
+    from clean import Clean
+    return Clean(serializer=None, raw_path=None, raw=raw_crawl(size, duplicate_rate, seed=seed)).clean()
@@ -0,0 +1,114 @@
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+COLORS = ['#FF0000', '#0000FF', '#00FF00']
+
+
+def chart_key(chart):
+    # Content address of a chart: its spec, styling and the aggregates it plots
+    return hashlib.sha256(json.dumps(chart, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def render(chart, path):
+    # Object oriented Agg API, no global pyplot state so charts can render in separate processes
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    fig.subplots_adjust(**chart['margins'])
+    ax = fig.add_subplot(111)
+    if chart['group_by'] is None:
+        labels = [label for label, _ in chart['data']]
+        ax.bar(labels, [value for _, value in chart['data']], **chart['style'])
+        ax.set_xticks(range(len(labels)))
+        ax.set_xticklabels(labels, rotation=45, fontsize=8)
+    else:
+        groups = chart['data']
+        # Total width for all bars at one x location
+        total_width = 0.9
+        # Width of each individual bar
+        ind_width = total_width / len(groups)
+        # This centers each cluster of bars about the x tick mark
+        alteration = np.arange(
+            -(total_width / len(groups)),
+            (total_width / len(groups)) + (ind_width / 2),
+            ind_width
+        )
+        # Draw bars, one category at a time
+        for i, (group, values) in enumerate(groups):
+            # Move the bar to the right on the x-axis so it doesn't
+            # overlap with previously drawn ones
+            ax.bar(
+                np.arange(len(values)) + alteration[i],
+                [value for _, value in values],
+                color=COLORS[i % len(COLORS)],
+                label=group,
+                width=ind_width
+            )
+        labels = [label for label, _ in groups[-1][1]]
+        ax.set_xticks(list(np.arange(0, len(labels), 1)))
+        ax.set_xticklabels(labels, rotation=45, fontsize=8)
+        ax.legend(loc='upper right')
+    ax.set_ylabel(chart['ylabel'])
+    ax.set_xlabel(chart['xlabel'])
+    ax.set_title(chart['title'])
+    fig.savefig(path, format='png')
+    return path
+
+
+def _render_into(chart, path):
+    # Written under a temporary name first so an interrupted render never lands in the cache
+    render(chart, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+class ChartCache:
+    # Rendered charts are stored under their content hash, unchanged charts are only copied into place.
+    # Cache entries the latest build does not use are deleted, so the cache holds one build's charts
+    def __init__(self, charts_path, workers=None):
+        self.charts_path = charts_path
+        self.cache_path = os.path.join(charts_path, 'cache')
+        self.workers = workers
+        # Target path -> cache file last copied there by this instance
+        self._copied = {}
+        os.makedirs(self.cache_path, exist_ok=True)
+
+    def build(self, charts):
+        cached = {chart['name']: os.path.join(self.cache_path, chart_key(chart) + '.png') for chart in charts}
+        missing = [chart for chart in charts if not os.path.exists(cached[chart['name']])]
+        if len(missing) > 1 and self.workers != 1:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(_render_into, missing, [cached[chart['name']] for chart in missing]))
+        else:
+            for chart in missing:
+                _render_into(chart, cached[chart['name']])
+        for chart in charts:
+            target = os.path.join(self.charts_path, chart['name'])
+            if not self._same(cached[chart['name']], target):
+                shutil.copyfile(cached[chart['name']], target)
+                self._copied[target] = cached[chart['name']]
+        self._prune(set(cached.values()))
+        self.rendered = len(missing)
+        return [os.path.join(self.charts_path, chart['name']) for chart in charts]
+
+    def _prune(self, keep):
+        for name in os.listdir(self.cache_path):
+            path = os.path.join(self.cache_path, name)
+            if path not in keep:
+                os.remove(path)
+
+    def _same(self, source, target):
+        # Within a run the target is known from the last copy, only the first build compares bytes
+        if self._copied.get(target) == source:
+            return True
+        if os.path.exists(target) and filecmp.cmp(source, target, shallow=False):
+            self._copied[target] = source
+            return True
+        return False
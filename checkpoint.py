@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import threading
+
+from statement import Statement
+
+
+class Checkpoint:
+    # Append-only JSONL journal of crawled pages, keyed by personality link and page number.
+    # Pages are appended as they are crawled, so a crash loses at most the page in flight.
+    # An unfinished run is resumed. Otherwise a new run starts, a full one that replaces the results
+    # of earlier runs, or with refresh one that adds only statements newer than what is journaled.
+    # A full run restarts the journal, so it only ever holds the runs since the last full one
+    def __init__(self, path, refresh=False):
+        self.path = path
+        self.refresh = refresh
+        self.run = 0
+        self.finished = False
+        self.links = None
+        self.pages = {}
+        self.done = set()
+        self.known = set()
+        self.entries = []
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self._load()
+        if not self.run or self.finished:
+            self._start_run()
+
+    def _load(self):
+        # Streamed with one line of lookahead, so only the last line may be torn
+        with open(self.path, 'rb') as journal:
+            offset = 0
+            line = journal.readline()
+            while line:
+                following = journal.readline()
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError('no trailing newline')
+                    entry = json.loads(line) if line.strip() else None
+                except ValueError:
+                    if following:
+                        raise
+                    # A crash mid-append leaves a torn last line, cut it off so the next append starts clean
+                    print(f'Dropping the incomplete last entry of {self.path}')
+                    journal.close()
+                    with open(self.path, 'r+b') as torn:
+                        torn.truncate(offset)
+                    return
+                if entry is not None:
+                    self._replay(entry, offset)
+                offset += len(line)
+                line = following
+
+    def _replay(self, entry, offset):
+        if entry['type'] == 'run':
+            self.run = entry['run']
+            self.finished = False
+            if entry.get('full'):
+                self.entries = []
+                self.known = set()
+            self.links = None
+            self.pages = {}
+            self.done = set()
+        elif entry['type'] == 'links':
+            self.links = entry['links']
+        elif entry['type'] == 'page':
+            # Statements stay on disk, only where to find them is kept in memory
+            self.pages.setdefault(entry['link'], {})[entry['page']] = {'next': entry['next']}
+            self.entries.append((self.run, entry['link'], entry['page'], offset))
+            # Only a refresh run filters against earlier statements, and a digest each is all it needs
+            if self.refresh:
+                for statement in entry['statements']:
+                    self.known.add(self._key(statement))
+        elif entry['type'] == 'done':
+            self.done.add(entry['link'])
+        elif entry['type'] == 'finished':
+            self.finished = True
+
+    def _append(self, entry):
+        with self._lock:
+            with open(self.path, 'ab') as journal:
+                offset = journal.tell()
+                journal.write((json.dumps(entry) + '\n').encode('utf-8'))
+            self._replay(entry, offset)
+
+    def _start_run(self):
+        entry = {'type': 'run', 'run': self.run + 1, 'full': not self.refresh}
+        if not self.finished or self.refresh:
+            self._append(entry)
+            return
+        # Nothing journaled so far survives a full run, leaving it in place would only make every
+        # startup and the file grow with the number of past runs
+        with open(self.path + '.tmp', 'wb') as journal:
+            journal.write((json.dumps(entry) + '\n').encode('utf-8'))
+        os.replace(self.path + '.tmp', self.path)
+        self._replay(entry, 0)
+
+    def _key(self, statement):
+        key = f"{statement['text']}\x1f{statement['source']}".encode('utf-8')
+        return hashlib.blake2b(key, digest_size=16).digest()
+
+    def record_links(self, links):
+        self._append({'type': 'links', 'links': links})
+
+    def record_page(self, link, page, url, next_url, statements):
+        self._append({
+            'type': 'page',
+            'link': link,
+            'page': page,
+            'url': url,
+            'next': next_url,
+            'statements': [statement.to_dict() if isinstance(statement, Statement) else statement
+                           for statement in statements]
+        })
+
+    def complete(self, link):
+        self._append({'type': 'done', 'link': link})
+
+    def finish(self):
+        self._append({'type': 'finished'})
+
+    def is_complete(self, link):
+        return link in self.done
+
+    def resume_point(self, link):
+        # Page number and url to continue from for a personality that was interrupted mid-way
+        pages = self.pages.get(link)
+        if not pages:
+            return 1, None
+        last = max(pages)
+        return last + 1, pages[last]['next']
+
+    def filter_new(self, statements):
+        # Listings are newest first, so the first already known statement means the rest of
+        # this personality was fetched by an earlier run
+        new = []
+        for statement in statements:
+            if self._key(statement) in self.known:
+                return new, True
+            new.append(statement)
+        return new, False
+
+    def iter_results(self, links=None):
+        # Every statement recorded across all runs, ordered by run, personality and page so that
+        # the output does not depend on which worker finished first
+        order = {link['link']: index for index, link in enumerate(links or self.links or [])}
+        entries = sorted(self.entries, key=lambda e: (e[0], order.get(e[1], len(order)), e[2]))
+        with open(self.path, 'rb') as journal:
+            for _, _, _, offset in entries:
+                journal.seek(offset)
+                yield from map(Statement.from_dict, json.loads(journal.readline())['statements'])
+
+    def results(self, links=None):
+        return list(self.iter_results(links))
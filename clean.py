@@ -1,81 +1,170 @@
+import argparse
+import gc
+import multiprocessing
 import pickle
-import datetime
+import sys
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import columnar
+from dates import DateParser
+from dedup import Deduplicator
+from metrics import Metrics
+from query import Index
+import statement
+from statement import Statement
 
 RAW_DATA_PATH = 'data/results.pickle'
 
 
+# Shards handed to forked workers without pickling them, see Clean.clean_parallel
+_SHARDS = []
+
+
+def _clean_shard(shard, normalize, hashed):
+    # Runs in a worker process: format and dedup one shard, ids are the global flat positions
+    if isinstance(shard, int):
+        shard = _SHARDS[shard]
+    clean = Clean(serializer=None, raw_path=None, normalize=normalize, hashed=hashed)
+    dedup = Deduplicator(normalize=normalize, hashed=hashed)
+    positions = {}
+    for count, point in shard:
+        kept, _ = dedup.add(clean._format(point), count)
+        if kept is not None:
+            positions[kept['id']] = count
+    # Only the formatted fields travel back, the parent still holds the rest of every record
+    kept = [(i['id'], positions[i['id']], i['date'], i['edition'], i['rating']) for i in dedup.records]
+    return kept, dedup.report, clean.date_parser.unparseable
+
+
 class Clean():
-    def __init__(self, serializer, raw_path):
+    def __init__(self, serializer, raw_path, raw=None, normalize=False, hashed=False, metrics=None):
         self.serializer = serializer
+        self.metrics = metrics or Metrics()
         self.raw_path = raw_path
-        self.raw = serializer.load(open(self.raw_path, 'rb'))
+        # No raw path means records are fed in through stream()
+        self.raw = raw if raw is not None or raw_path is None else statement.load(serializer, self.raw_path)
         self.output_path = 'data/cleaned.pickle'
+        self.columnar_path = 'data/cleaned'
+        self.normalize = normalize
+        self.hashed = hashed
+        self.date_parser = DateParser()
+
+    def _flatten(self, raw):
+        for point in raw:
+            for instance in point if isinstance(point, (list, tuple)) else [point]:
+                assert isinstance(instance, (Statement, dict)), \
+                    "Data not in appropriate format, structures deeper than list of list of dict discovered"
+                # Dicts come from results.pickle files written before Statement existed
+                yield instance if isinstance(instance, Statement) else Statement.from_dict(instance)
+
+    def _format(self, point):
+        point.date = self._format_date(point.date)
+        point.edition = sys.intern(self._format_edition(point.edition))
+        point.rating = sys.intern(self._format_rating(point.rating))
+        return point
 
     def clean(self):
-        flat = []
-        # Flatten data
-        for point in self.raw:
-            if isinstance(point, (list, tuple)):
-                for instance in point:
-                    flat.append(instance)
-            else:
-                flat.append(instance)
-        assert all([isinstance(i, dict) for i in flat]), \
-            "Data not in appropriate format, structures deeper than list of list of dict discovered"
-
-        # Remove duplicate entries and add sequential IDs
-        cleaned = []
-        duplicates = []
-        count = 0
-        # O(n^2)
-        for point in flat:
-            point['date'] = self._format_date(point['date'])
-            point['edition'] = self._format_edition(point['edition'])
-            point['rating'] = self._format_rating(point['rating'])
-            duplicate = self._contains_entry(cleaned, point)
-            if not duplicate:
-                cleaned.append({**point, **{'id': count}})
-            else:
-                # In case of duplicates, append one with the latest date since politifact can
-                # Reanalyze claims. Most recent one matters; older ones are ignored
-                actual = self._get_later(point, duplicate)
-                duplicates.append([point, duplicate])
-                if 'id' not in actual:
-                    cleaned.append({**actual, **{'id': duplicate['id']}})
-            count += 1
-
+        with self.metrics.stage('clean'):
+            # Flatten data
+            with self.metrics.stage('flatten'):
+                flat = list(self._flatten(self.raw))
+
+            # Remove duplicate entries and add sequential IDs
+            # O(n) - single pass keyed on (text, source)
+            with self.metrics.stage('format_dedup'):
+                dedup = Deduplicator(normalize=self.normalize, hashed=self.hashed)
+                for count, point in enumerate(flat):
+                    dedup.add(self._format(point), count)
+                cleaned = dedup.records
+                self.duplicates = dedup.report
+
+            assert all(['id' in i for i in cleaned]), \
+                "Data was not cleaned appropriately, duplicate entry mistakenly retained"
+
+            print(len(flat) - len(cleaned), 'duplicate entries removed')
+            self._report_dates()
+            self.metrics.count('records', len(flat))
+            self.metrics.count('unique', len(cleaned))
 
-        assert all(['id' in i for i in cleaned]), \
-            "Data was not cleaned appropriately, duplicate entry mistakenly retained"
+        self.cleaned = cleaned
+        return self.cleaned
 
-        print(len(flat) - len(cleaned), 'duplicate entries removed')
+    def clean_parallel(self, workers=4):
+        # Every copy of a statement hashes to the same shard, so shards dedup independently with the
+        # same latest-date-wins rule and ids are the same as a serial clean
+        with self.metrics.stage('clean'):
+            with self.metrics.stage('shard'):
+                flat = list(self._flatten(self.raw))
+                keys = Deduplicator(normalize=self.normalize, hashed=self.hashed)
+                shards = [[] for _ in range(workers)]
+                for count, point in enumerate(flat):
+                    shards[self._shard(keys._key(point), workers)].append((count, point))
+
+            # Forked workers inherit the shards copy-on-write, other start methods get them pickled
+            if 'fork' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('fork')
+                _SHARDS[:] = shards
+                tasks = range(workers)
+                # Keeps the collector in the children from touching, and so copying, every inherited object
+                gc.freeze()
+            else:
+                context = None
+                tasks = shards
+            try:
+                with self.metrics.stage('workers'):
+                    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                        results = list(pool.map(_clean_shard, tasks, repeat(self.normalize), repeat(self.hashed)))
+            finally:
+                _SHARDS.clear()
+                gc.unfreeze()
+
+            with self.metrics.stage('merge'):
+                kept = sorted(i for records, _, _ in results for i in records)
+                cleaned = []
+                for id, position, date, edition, rating in kept:
+                    point = flat[position]
+                    point.date, point.id = date, id
+                    point.edition, point.rating = sys.intern(edition), sys.intern(rating)
+                    cleaned.append(point)
+                self.duplicates = sorted((i for _, report, _ in results for i in report),
+                                         key=lambda i: i['duplicate_id'])
+                self.date_parser.unparseable = sum((unparseable for _, _, unparseable in results), Counter())
+
+            print(len(flat) - len(cleaned), 'duplicate entries removed')
+            self._report_dates()
+            self.metrics.count('records', len(flat))
+            self.metrics.count('unique', len(cleaned))
 
         self.cleaned = cleaned
         return self.cleaned
 
-    def _contains_entry(self, data, entry):
-        # O(n)
-        keys = ['text', 'source']
-        for point in data:
-            if all([entry[i] == point[i] for i in keys]):
-                return point
-        else:
-            return None
-
-    def _get_later(self, point, duplicate):
-        if point['date'] - duplicate['date'] > datetime.timedelta(0):
-            return point
-        else:
-            return duplicate
+    def _shard(self, key, workers):
+        # crc32 rather than hash() so shard assignment does not depend on PYTHONHASHSEED
+        if isinstance(key, tuple):
+            key = '\x1f'.join(key).encode('utf-8')
+        return zlib.crc32(key) % workers
+
+    def stream(self, raw, retain=('rating', 'affiliation', 'edition', 'source')):
+        # Per-record cleaning for the streaming pipeline: yields (kept, superseded) whenever the
+        # kept record for a statement changes. Superseded records only carry id, date and `retain`
+        self.dedup = Deduplicator(normalize=self.normalize, hashed=self.hashed, keep_records=False, retain=retain)
+        for count, point in enumerate(self._flatten(raw)):
+            kept, superseded = self.dedup.add(self._format(point), count)
+            if kept is not None:
+                yield kept, superseded
+        print(self.dedup.duplicates, 'duplicate entries removed')
+        self._report_dates()
+
+    def _report_dates(self):
+        self.unparseable_dates = self.date_parser.report()
+        if self.unparseable_dates['unparseable']:
+            print(self.unparseable_dates['unparseable'], 'unparseable dates, e.g.', self.unparseable_dates['examples'])
 
     def _format_date(self, date):
-        suffixes = ['st', 'nd', 'rd', 'th']
-        # O(n)
-        for suffix in suffixes:
-            try:
-                return datetime.datetime.strptime(date, f'on %A, %B %d{suffix}, %Y')
-            except ValueError:
-                pass
+        return self.date_parser(date)
 
     def _format_edition(self, edition):
         return edition.replace("— ", "", 1)
@@ -83,9 +172,30 @@ class Clean():
     def _format_rating(self, rating):
         return rating.lower()
 
-    def write(self):
-        self.serializer.dump(self.cleaned, open(self.output_path, 'wb'))
-
-c = Clean(serializer=pickle, raw_path=RAW_DATA_PATH)
-c.clean()
-c.write()
+    def write(self, format='pickle'):
+        if format in ('pickle', 'both'):
+            self.serializer.dump(self.cleaned, open(self.output_path, 'wb'))
+        if format in ('columnar', 'both'):
+            columnar.dump(self.cleaned, self.columnar_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Flatten, format and deduplicate crawled statements')
+    parser.add_argument('--format', choices=['pickle', 'columnar', 'both'], default='pickle')
+    parser.add_argument('--workers', type=int, default=1, help='processes for sharded cleaning')
+    parser.add_argument('--index', action='store_true', help='update the query index next to the cleaned data')
+    parser.add_argument('--metrics', help='write a JSON report of stage timings and counters here')
+    parser.add_argument('--profile', action='store_true', help='run stages under cProfile, needs --metrics')
+    args = parser.parse_args()
+    metrics = Metrics(enabled=bool(args.metrics), profile=args.profile)
+    c = Clean(serializer=pickle, raw_path=RAW_DATA_PATH, metrics=metrics)
+    if args.workers > 1:
+        c.clean_parallel(args.workers)
+    else:
+        c.clean()
+    with metrics.stage('write'):
+        c.write(args.format)
+    if args.index:
+        with metrics.stage('index'):
+            Index.open(pickle, c.columnar_path if args.format == 'columnar' else c.output_path, c.cleaned)
+    metrics.write(args.metrics)
@@ -0,0 +1,130 @@
+import json
+import os
+
+import numpy as np
+
+import statement
+
+VERSION = 1
+# How each statement field is laid out on disk
+SCHEMA = {
+    'mugshot': 'categorical',
+    'source': 'categorical',
+    'text': 'text',
+    'edition': 'categorical',
+    'date': 'date',
+    'rating': 'categorical',
+    'reason': 'text',
+    'affiliation': 'categorical',
+    'id': 'int'
+}
+
+
+class Categorical:
+    # Dictionary encoded column, `codes` index into `categories`
+    def __init__(self, codes, categories):
+        self.codes = codes
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.categories[self.codes[index]]
+
+    def __iter__(self):
+        categories = self.categories
+        return (categories[code] for code in self.codes.tolist())
+
+
+class Text:
+    # Variable length strings stored as one utf-8 buffer plus offsets
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        buffer = bytes(self.data)
+        offsets = self.offsets.tolist()
+        return (buffer[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:]))
+
+
+def dump(records, path):
+    os.makedirs(path, exist_ok=True)
+    meta = {'version': VERSION, 'length': len(records), 'columns': {}}
+    for column, kind in SCHEMA.items():
+        values = [record[column] for record in records]
+        meta['columns'][column] = {'kind': kind}
+        if kind == 'categorical':
+            categories = sorted(set(values))
+            lookup = {value: code for code, value in enumerate(categories)}
+            codes = np.array([lookup[value] for value in values], dtype=np.min_scalar_type(len(categories)))
+            np.save(os.path.join(path, f'{column}.npy'), codes)
+            meta['columns'][column]['categories'] = categories
+        elif kind == 'text':
+            encoded = [value.encode('utf-8') for value in values]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            np.save(os.path.join(path, f'{column}.offsets.npy'), offsets)
+            np.save(os.path.join(path, f'{column}.data.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+        elif kind == 'date':
+            dates = np.array([np.datetime64(value, 's') if value else np.datetime64('NaT') for value in values],
+                             dtype='datetime64[s]')
+            np.save(os.path.join(path, f'{column}.npy'), dates)
+        else:
+            np.save(os.path.join(path, f'{column}.npy'), np.array(values, dtype=np.int64))
+    with open(os.path.join(path, 'meta.json'), 'w') as file:
+        json.dump(meta, file)
+
+
+def load(path, columns=None, mmap=False):
+    # Only the requested columns are read, with mmap the arrays are paged in lazily
+    with open(os.path.join(path, 'meta.json')) as file:
+        meta = json.load(file)
+    if meta['version'] != VERSION:
+        raise ValueError(f"Unsupported columnar version {meta['version']} in {path}")
+    mode = 'r' if mmap else None
+    table = {}
+    for column in columns or meta['columns']:
+        info = meta['columns'][column]
+        if info['kind'] == 'categorical':
+            table[column] = Categorical(np.load(os.path.join(path, f'{column}.npy'), mmap_mode=mode),
+                                        info['categories'])
+        elif info['kind'] == 'text':
+            table[column] = Text(np.load(os.path.join(path, f'{column}.offsets.npy'), mmap_mode=mode),
+                                 np.load(os.path.join(path, f'{column}.data.npy'), mmap_mode=mode))
+        else:
+            table[column] = np.load(os.path.join(path, f'{column}.npy'), mmap_mode=mode)
+    return table
+
+
+def records(table):
+    # Row view for code that still iterates over dicts
+    columns = list(table)
+    values = []
+    for column in columns:
+        data = table[column]
+        if isinstance(data, np.ndarray) and data.dtype.kind == 'M':
+            values.append(data.astype('datetime64[us]').tolist())
+        elif isinstance(data, np.ndarray):
+            values.append(data.tolist())
+        else:
+            values.append(list(data))
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def is_columnar(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, 'meta.json'))
+
+
+def read(serializer, path, columns=None, mmap=False):
+    # Loads records from either a columnar directory or a serialized file such as cleaned.pickle
+    if is_columnar(path):
+        return statement.convert(records(load(path, columns, mmap)))
+    return statement.load(serializer, path)
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import re
+
+import numpy as np
+
+from columnar import Categorical, Text
+from vectorize import normalize
+
+# Bump when extraction or tokenization changes so stale caches are not reused
+VERSION = 1
+CACHE_DIR = 'data/cache'
+QUOTE = re.compile(r'".*?"')
+
+
+def tokenize(text):
+    return text.lower().split()
+
+
+def _encode(strings):
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def _categorical(values):
+    categories = sorted(set(values))
+    lookup = {value: code for code, value in enumerate(categories)}
+    return Categorical(np.array([lookup[value] for value in values], dtype=np.int32), categories)
+
+
+def dataset_hash(data):
+    digest = hashlib.sha256(f'corpus-{VERSION}'.encode('utf-8'))
+    for claim in data:
+        digest.update(f"{claim['text']}\x1f{claim['affiliation']}\x1f{claim['rating']}\x1e".encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Corpus:
+    # Quotes from the cleaned statements, normalized and tokenized once. Quote i's tokens are
+    # token_ids[offsets[i]:offsets[i + 1]], indexes into vocabulary
+    def __init__(self, texts, affiliations, ratings, vocabulary, token_ids, offsets, hash):
+        self.texts = texts
+        self.affiliations = affiliations
+        self.ratings = ratings
+        self.vocabulary = vocabulary
+        self.token_ids = token_ids
+        self.offsets = offsets
+        self.hash = hash
+        self._terms = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def build(cls, data, hash=None):
+        texts, affiliations, ratings = [], [], []
+        vocabulary = {}
+        token_ids = []
+        offsets = [0]
+        for claim in data:
+            for quote in QUOTE.findall(claim['text']):
+                text = normalize(quote)
+                texts.append(text)
+                affiliations.append(claim['affiliation'])
+                ratings.append(claim['rating'])
+                token_ids.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokenize(text))
+                offsets.append(len(token_ids))
+        return cls(
+            Text(*_encode(texts)),
+            _categorical(affiliations),
+            _categorical(ratings),
+            Text(*_encode(vocabulary)),
+            np.array(token_ids, dtype=np.int32),
+            np.array(offsets, dtype=np.int64),
+            hash or dataset_hash(data)
+        )
+
+    @classmethod
+    def cached(cls, data, cache_dir=CACHE_DIR):
+        # Keyed by the dataset hash, so a re-cleaned dataset gets a new cache file rather than a stale one
+        hash = dataset_hash(data)
+        path = os.path.join(cache_dir, f'quotes-{hash[:16]}.npz')
+        if os.path.exists(path):
+            corpus = cls.load(path)
+            if corpus.hash == hash:
+                return corpus
+        corpus = cls.build(data, hash)
+        os.makedirs(cache_dir, exist_ok=True)
+        corpus.save(path)
+        return corpus
+
+    def save(self, path):
+        np.savez(
+            path,
+            hash=np.array(self.hash),
+            texts_offsets=self.texts.offsets,
+            texts_data=self.texts.data,
+            affiliation_codes=self.affiliations.codes,
+            affiliation_categories=np.array(self.affiliations.categories, dtype=str),
+            rating_codes=self.ratings.codes,
+            rating_categories=np.array(self.ratings.categories, dtype=str),
+            vocabulary_offsets=self.vocabulary.offsets,
+            vocabulary_data=self.vocabulary.data,
+            token_ids=self.token_ids,
+            offsets=self.offsets
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(
+                Text(arrays['texts_offsets'], arrays['texts_data']),
+                Categorical(arrays['affiliation_codes'], arrays['affiliation_categories'].tolist()),
+                Categorical(arrays['rating_codes'], arrays['rating_categories'].tolist()),
+                Text(arrays['vocabulary_offsets'], arrays['vocabulary_data']),
+                arrays['token_ids'],
+                arrays['offsets'],
+                str(arrays['hash'])
+            )
+
+    def terms(self):
+        if self._terms is None:
+            self._terms = list(self.vocabulary)
+        return self._terms
+
+    def ids(self, index):
+        return self.token_ids[self.offsets[index]:self.offsets[index + 1]]
+
+    def select(self, indexes):
+        # Concatenated token ids of the given quotes and the length of each, without a Python loop
+        indexes = np.asarray(indexes, dtype=np.int64)
+        starts = self.offsets[indexes]
+        lengths = self.offsets[indexes + 1] - starts
+        shift = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return self.token_ids[np.arange(lengths.sum()) + shift], lengths
+
+    def tokens(self, index):
+        terms = self.terms()
+        return [terms[id] for id in self.ids(index).tolist()]
+
+    def quotes(self):
+        # Fresh dicts every call, nothing handed out aliases the cleaned statements. Text stays in the
+        # corpus, texts[quote['index']], so the dicts do not hold a second copy of every quote
+        return [{'index': index, 'affiliation': affiliation, 'rating': rating}
+                for index, (affiliation, rating) in enumerate(zip(self.affiliations, self.ratings))]
@@ -1,93 +1,192 @@
+import argparse
 import pickle
 import pprint
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from selenium import webdriver
+from selenium.common.exceptions import NoSuchElementException
+
+from checkpoint import Checkpoint
+from extract import Extractor
+from metrics import Metrics
+from pagecache import CACHE_PATH, MAX_BYTES, TTL, PageCache
+from scheduler import Scheduler
+from statement import Statement
+from workers import WORKERS
+
+ROOT = "http://www.politifact.com/personalities/"
+BASE = "http://www.politifact.com/"
+CHECKPOINT_PATH = 'data/crawl.jsonl'
 
 
 class Crawler:
-    def __init__(self, serializer):
+    def __init__(self, serializer, checkpoint_path=CHECKPOINT_PATH, since_last_run=False, extraction='elements',
+                 root=ROOT, metrics=None, timeout=15, retries=3, rate=0, burst=1, backoff=0.5, requeue=0):
         self.serializer = serializer
-        self.root = "http://www.politifact.com/personalities/"
-        self.base = "http://www.politifact.com/"
-        self.driver = webdriver.Firefox()
-        self._safe_get(self.root)
+        self.metrics = metrics or Metrics()
+        self.checkpoint = Checkpoint(checkpoint_path, refresh=since_last_run)
+        self.since_last_run = since_last_run
+        self.extraction = extraction
+        self.root = root
+        self.base = BASE
         self.valid = ['democrat', 'republican', 'independent']
+        self.extractor = Extractor(self.valid)
+        self.requeue = requeue
+        self.failures = []
+        self.driver = webdriver.Firefox()
+        self.driver.set_page_load_timeout(timeout)
+        # One browser, so one fetch at a time, the scheduler adds rate limiting and retries with backoff
+        self.scheduler = Scheduler(self.driver.get, workers=1, rate=rate, burst=burst, retries=retries,
+                                   backoff=backoff, metrics=self.metrics)
         self.links_path = 'data/links.pickle'
         self.results_path = 'data/results.pickle'
+        if not self._safe_get(self.root):
+            self.close()
+            raise Exception(f'Could not load {self.root}')
 
     def _safe_get(self, url):
+        # False once the page has failed every retry, the scheduler keeps it in its dead letters
         try:
-            self.driver.set_page_load_timeout(15)
-            self.driver.get(url)
-        except Exception as e:
-            print(e)
-            self.driver.set_page_load_timeout(30)
+            self.scheduler.get(url)
+        except Exception:
+            return False
+        self.metrics.count('pages_fetched')
+        return True
 
-    def _safe_click(self, element):
-        try:
-            self.driver.set_page_load_timeout(15)
-            element.click()
-        except Exception as e:
-            print(e)
-            self.driver.set_page_load_timeout(30)
+    def close(self):
+        self.scheduler.close()
+        self.driver.close()
+
+    def _take_failures(self, links):
+        # Personalities with a dead-lettered page, visiting them again resumes from that page
+        self.scheduler.take_dead_letters()
+        failed = {failure['link'] for failure in self.failures}
+        self.failures = []
+        return [(index, link) for index, link in enumerate(links) if link['link'] in failed]
+
+    def _get_checkpoint_links(self):
+        links = self.checkpoint.links
+        if links is None:
+            links = self.get_links()
+            self.checkpoint.record_links(links)
+        self.serializer.dump(links, open(self.links_path, 'wb'))
+        return links
 
     def collect(self):
         try:
-            elems = self.driver.find_elements_by_css_selector("li .az-list__item")
-            links = []
-            for index, elem in enumerate(elems):
-                print(index, '-', len(elems))
-                spans = elem.find_elements_by_css_selector('span')
-                if spans and spans[0].text.lower() in self.valid:
-                    links.append({
-                        'link': elem.find_element_by_css_selector('a').get_attribute('href'),
-                        'affiliation': spans[0].text.lower()
-                    })
-
-            self.serializer.dump(links, open(self.links_path, 'wb'))
-
-            results = []
+            with self.metrics.stage('crawl'):
+                links = self._get_checkpoint_links()
+                pending = list(enumerate(links))
+                for attempt in range(self.requeue + 1):
+                    if attempt:
+                        pending = self._take_failures(links)
+                    for index, link in pending:
+                        print(index, '-', len(links))
+                        if self.checkpoint.is_complete(link['link']):
+                            continue
+                        result = self.visit(link)
+                        pprint.pprint(result)
+                    if not self.failures:
+                        break
+                if not self.failures:
+                    self.checkpoint.finish()
+                else:
+                    print(len(self.failures), 'personalities left incomplete, rerun to resume them')
+                self.serializer.dump(self.checkpoint.results(links), open(self.results_path, 'wb'))
+        finally:
+            self.close()
+
+    def get_links(self):
+        if self.extraction == 'page_source':
+            document = self.extractor.parse(self.driver.page_source)
+            return self.extractor.get_personalities(document, self.driver.current_url)
+        elems = self.driver.find_elements_by_css_selector("li .az-list__item")
+        links = []
+        for index, elem in enumerate(elems):
+            print(index, '-', len(elems))
+            spans = elem.find_elements_by_css_selector('span')
+            if spans and spans[0].text.lower() in self.valid:
+                links.append({
+                    'link': elem.find_element_by_css_selector('a').get_attribute('href'),
+                    'affiliation': spans[0].text.lower()
+                })
+        return links
+
+    def stream(self):
+        # Yields statements as pages are parsed so cleaning can start before the crawl finishes
+        try:
+            links = self._get_checkpoint_links()
+            # Pages journaled by earlier or interrupted runs are replayed first
+            yield from self.checkpoint.iter_results(links)
             for index, link in enumerate(links):
                 print(index, '-', len(links))
-                result = self.visit(link)
-                new_result = []
-                for r in result:
-                    r['affiliation'] = link['affiliation']
-                    new_result.append(r)
-                pprint.pprint(new_result)
-                results += new_result
-                self.serializer.dump(results, open(self.results_path, 'wb'))
-        except:
-            self.driver.close()
-            raise
+                if not self.checkpoint.is_complete(link['link']):
+                    yield from self.iter_visit(link)
+            for _ in range(self.requeue):
+                for _, link in self._take_failures(links):
+                    yield from self.iter_visit(link)
+            if not self.failures:
+                self.checkpoint.finish()
+        finally:
+            self.close()
 
     def visit(self, url):
-        self._safe_get(url['link'] + 'statements/by')
-        data = self.visit_page()
-        _next = self._try_get_next_link()
-        while _next:
-            self._safe_click(_next)
-            data += self.visit_page()
+        return list(self.iter_visit(url))
+
+    def iter_visit(self, url):
+        page, resume = self.checkpoint.resume_point(url['link'])
+        if page > 1 and not resume:
+            # Interrupted after its last page was already recorded
+            self.checkpoint.complete(url['link'])
+            return
+        page_url = resume or url['link'] + 'statements/by'
+        while True:
+            if not self._safe_get(page_url):
+                # Left incomplete in the checkpoint so a restart picks it up from this page
+                self.failures.append({'link': url['link'], 'url': page_url})
+                return
+            statements = list(self.visit_page())
+            for statement in statements:
+                statement['affiliation'] = url['affiliation']
+            self.metrics.count('statements_parsed', len(statements))
             _next = self._try_get_next_link()
-        return data
+            next_url = _next.get_attribute('href') if _next else None
+            if self.since_last_run:
+                statements, reached = self.checkpoint.filter_new(statements)
+                if reached:
+                    next_url = None
+            self.checkpoint.record_page(url['link'], page, self.driver.current_url, next_url, statements)
+            yield from statements
+            if not next_url:
+                break
+            page_url = next_url
+            page += 1
+        self.checkpoint.complete(url['link'])
+        self.metrics.count('personalities')
 
     def _try_get_next_link(self):
+        # Only a missing link ends the pagination, any other error is a real failure
         try:
             return self.driver.find_element_by_css_selector('.step-links__next')
-        except:
+        except NoSuchElementException:
             return None
 
     def visit_page(self):
+        if self.extraction == 'page_source':
+            # One round trip for the whole page instead of eight per statement
+            document = self.extractor.parse(self.driver.page_source)
+            yield from self.extractor.get_statements(document, self.driver.current_url)
+            return
         # Get all statements
         statements = self.driver.find_elements_by_css_selector('.statement')
-        data = []
         for statement in statements:
-            data.append(self.parse_statement(statement))
-        return data
+            yield self.parse_statement(statement)
 
     def parse_statement(self, element):
         # Get mugshot
-        data = {}
+        data = Statement()
         data['mugshot'] = element.find_element_by_css_selector('.mugshot img').get_attribute('src')
         data['source'] = element.find_element_by_css_selector('.statement__source a').text
         data['text'] = element.find_element_by_css_selector('.statement__text a').text
@@ -98,4 +197,231 @@ class Crawler:
         return data
 
 
-Crawler(serializer=pickle).collect()
+class ParallelCrawler:
+    def __init__(self, serializer, workers=4, mode='http', timeout=15, retries=3, root=ROOT,
+                 checkpoint_path=CHECKPOINT_PATH, since_last_run=False, metrics=None, cache=None, rate=0, burst=1,
+                 per_host=None, backoff=0.5, requeue=0):
+        if cache is not None and mode != 'http':
+            raise ValueError('The page cache needs http workers, browser pages are rendered rather than fetched')
+        self.serializer = serializer
+        self.metrics = metrics or Metrics()
+        self.cache = cache
+        self.checkpoint = Checkpoint(checkpoint_path, refresh=since_last_run)
+        self.since_last_run = since_last_run
+        self.root = root
+        self.workers = workers
+        self.worker_class = WORKERS[mode]
+        self.timeout = timeout
+        self.retries = retries
+        self.valid = ['democrat', 'republican', 'independent']
+        self.extractor = Extractor(self.valid)
+        self.links_path = 'data/links.pickle'
+        self.results_path = 'data/results.pickle'
+        self.requeue = requeue
+        self.failures = []
+        self._local = threading.local()
+        self._started = []
+        self._lock = threading.Lock()
+        # Pool threads parse and paginate, every fetch goes through the scheduler's own threads. Retries
+        # are the scheduler's, with backoff, so the workers make a single attempt
+        self.scheduler = Scheduler(self._fetch, workers=workers, rate=rate, burst=burst, per_host=per_host,
+                                   retries=retries, backoff=backoff, metrics=self.metrics)
+
+    def _worker(self):
+        # Each scheduler thread lazily owns one worker (and so one browser in browser mode)
+        if not hasattr(self._local, 'worker'):
+            options = {'cache': self.cache} if self.cache is not None else {}
+            self._local.worker = self.worker_class(timeout=self.timeout, retries=0, **options)
+            with self._lock:
+                self._started.append(self._local.worker)
+        return self._local.worker
+
+    def _fetch(self, url):
+        return self._worker().get(url)
+
+    def close(self):
+        self.scheduler.close()
+        for worker in self._started:
+            worker.close()
+
+    def get_links(self):
+        source, url = self.scheduler.get(self.root, priority=-1)
+        return self.extractor.get_personalities(self.extractor.parse(source), url)
+
+    def _take_failures(self, links):
+        # Personalities with a dead-lettered page, visiting them again resumes from that page rather than
+        # Scheduler.requeue refetching it, since what comes after the page depends on parsing it
+        self.scheduler.take_dead_letters()
+        failed = {failure['link'] for failure in self.failures}
+        self.failures = []
+        return [(index, link) for index, link in enumerate(links) if link['link'] in failed]
+
+    def _get_checkpoint_links(self):
+        links = self.checkpoint.links
+        if links is None:
+            links = self.get_links()
+            self.checkpoint.record_links(links)
+        self.serializer.dump(links, open(self.links_path, 'wb'))
+        return links
+
+    def stream(self):
+        # Yields statements personality by personality, in link order. At most two personalities
+        # per worker are in flight so a slow consumer never makes results pile up in memory
+        try:
+            links = self._get_checkpoint_links()
+            # Pages journaled by earlier or interrupted runs are replayed first
+            yield from self.checkpoint.iter_results(links)
+            pending = deque()
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                for index, link in enumerate(links):
+                    if self.checkpoint.is_complete(link['link']):
+                        continue
+                    pending.append(pool.submit(self.visit, link, index))
+                    if len(pending) >= self.workers * 2:
+                        yield from pending.popleft().result()
+                while pending:
+                    yield from pending.popleft().result()
+                for _ in range(self.requeue):
+                    for future in [pool.submit(self.visit, link, index) for index, link in self._take_failures(links)]:
+                        yield from future.result()
+            if not self.failures:
+                self.checkpoint.finish()
+        finally:
+            self.close()
+
+    def collect(self):
+        try:
+            with self.metrics.stage('crawl'):
+                links = self._get_checkpoint_links()
+                pending = [(index, link) for index, link in enumerate(links)
+                           if not self.checkpoint.is_complete(link['link'])]
+                with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                    for attempt in range(self.requeue + 1):
+                        if attempt:
+                            pending = self._take_failures(links)
+                        list(pool.map(lambda pair: self.visit(pair[1], pair[0]), pending))
+                        if not self.failures:
+                            break
+
+                if not self.failures:
+                    self.checkpoint.finish()
+                else:
+                    print(len(self.failures), 'personalities left incomplete, rerun to resume them')
+                # The journal orders pages by link, so the merged results are deterministic
+                results = self.checkpoint.results(links)
+                self.serializer.dump(results, open(self.results_path, 'wb'))
+                return results
+        finally:
+            self.close()
+
+    def visit(self, link, priority=0):
+        # Lower priorities are fetched first, the crawl passes link order so earlier personalities finish first
+        page, url = self.checkpoint.resume_point(link['link'])
+        if page == 1:
+            url = link['link'] + 'statements/by'
+        seen = set()
+        data = []
+        while url and url not in seen:
+            seen.add(url)
+            try:
+                source, url = self.scheduler.get(url, priority)
+                self.metrics.count('pages_fetched')
+            except Exception as e:
+                # Dead-lettered, left incomplete in the checkpoint so a requeue or restart resumes from this page
+                self.failures.append({'link': link['link'], 'url': url, 'error': repr(e)})
+                return data
+            document = self.extractor.parse(source)
+            statements = self.extractor.get_statements(document, url)
+            for statement in statements:
+                statement['affiliation'] = link['affiliation']
+            self.metrics.count('statements_parsed', len(statements))
+            next_url = self.extractor.get_next(document, url)
+            if self.since_last_run:
+                statements, reached = self.checkpoint.filter_new(statements)
+                if reached:
+                    next_url = None
+            self.checkpoint.record_page(link['link'], page, url, next_url, statements)
+            data += statements
+            url = next_url
+            page += 1
+        self.checkpoint.complete(link['link'])
+        self.metrics.count('personalities')
+        print(link['link'], '-', len(data))
+        return data
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crawl politifact personalities and their statements')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='size of the worker pool, 0 runs the single browser crawler')
+    parser.add_argument('--mode', choices=sorted(WORKERS), default='http')
+    parser.add_argument('--timeout', type=float, default=15, help='per worker page load timeout in seconds')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='attempts after the first before a page is dead-lettered')
+    parser.add_argument('--backoff', type=float, default=0.5,
+                        help='seconds before the first retry, doubling on each further one, with jitter')
+    parser.add_argument('--rate', type=float, default=0, help='requests a second per host, 0 does not limit')
+    parser.add_argument('--burst', type=int, default=1, help='requests a host may get at once before --rate applies')
+    parser.add_argument('--per-host', type=int, default=None, help='requests in flight per host, defaults to --workers')
+    parser.add_argument('--requeue', type=int, default=0,
+                        help='extra passes over personalities with dead-lettered pages before giving up')
+    parser.add_argument('--root', default=ROOT)
+    parser.add_argument('--extraction', choices=['elements', 'page_source'], default='elements',
+                        help='how the single browser crawler reads statements off a page')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH, help='append-only journal used to resume crawls')
+    parser.add_argument('--since-last-run', action='store_true',
+                        help='start a new run that stops paginating at statements already crawled')
+    parser.add_argument('--cache', action='store_true',
+                        help='keep fetched pages on disk and revalidate them instead of downloading again')
+    parser.add_argument('--cache-path', default=CACHE_PATH)
+    parser.add_argument('--cache-ttl', type=float, default=TTL,
+                        help='seconds a cached page is served without revalidating, 0 always revalidates')
+    parser.add_argument('--cache-size', type=float, default=MAX_BYTES / 2 ** 20,
+                        help='megabytes kept on disk before the least recently used pages are evicted')
+    parser.add_argument('--offline', action='store_true', help='replay the crawl from the page cache only')
+    parser.add_argument('--metrics', help='write a JSON report of stage timings and counters here')
+    parser.add_argument('--profile', action='store_true', help='run stages under cProfile, needs --metrics')
+    args = parser.parse_args()
+    metrics = Metrics(enabled=bool(args.metrics), profile=args.profile)
+    cache = None
+    if args.cache or args.offline:
+        if not args.workers or args.mode != 'http':
+            parser.error('--cache and --offline need --workers with --mode http')
+        cache = PageCache(args.cache_path, ttl=args.cache_ttl, max_bytes=int(args.cache_size * 2 ** 20),
+                          offline=args.offline, metrics=metrics)
+    if not args.workers and args.per_host is not None:
+        parser.error('--per-host needs --workers, the browser crawler makes one request at a time')
+    if args.workers:
+        ParallelCrawler(
+            serializer=pickle,
+            workers=args.workers,
+            mode=args.mode,
+            timeout=args.timeout,
+            retries=args.retries,
+            root=args.root,
+            checkpoint_path=args.checkpoint,
+            since_last_run=args.since_last_run,
+            metrics=metrics,
+            cache=cache,
+            rate=args.rate,
+            burst=args.burst,
+            per_host=args.per_host,
+            backoff=args.backoff,
+            requeue=args.requeue
+        ).collect()
+    else:
+        Crawler(
+            serializer=pickle,
+            checkpoint_path=args.checkpoint,
+            since_last_run=args.since_last_run,
+            extraction=args.extraction,
+            root=args.root,
+            metrics=metrics,
+            timeout=args.timeout,
+            retries=args.retries,
+            rate=args.rate,
+            burst=args.burst,
+            backoff=args.backoff,
+            requeue=args.requeue
+        ).collect()
+    metrics.write(args.metrics)
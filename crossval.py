@@ -0,0 +1,182 @@
+import argparse
+import gc
+import itertools
+import json
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from learn import DATA_PATH, Bayesian
+from naive_bayes import MODELS
+from vectorize import Vectorizer
+
+CATEGORIES = ['true', 'false', 'neutral']
+BALANCES = ('none', 'uniform', 'undersample')
+
+# What the pool workers share, inherited through fork or handed over once per worker by the initializer
+_SHARED = {}
+
+
+def stratified_folds(strata, folds, seed=0):
+    # Each stratum (raw rating) is shuffled and dealt round robin, continuing the deal across strata
+    # keeps every fold within one quote of the same size
+    rng = np.random.RandomState(seed)
+    assignment = np.empty(len(strata), dtype=np.int64)
+    start = 0
+    for stratum in np.unique(strata):
+        members = np.flatnonzero(strata == stratum)
+        rng.shuffle(members)
+        assignment[members] = (np.arange(len(members)) + start) % folds
+        start += len(members)
+    return [np.flatnonzero(assignment == fold) for fold in range(folds)]
+
+
+def configurations(models=('multinomial',), ngram_ranges=((1, 1),), alphas=(1.0,), features=('counts',),
+                   balances=('none',)):
+    # The grid of settings to sweep, Bernoulli only ever sees term presence so it skips 'counts'
+    grid = []
+    for model, ngram_range, alpha, feature, balance in itertools.product(models, ngram_ranges, alphas, features,
+                                                                       balances):
+        if model == 'bernoulli' and feature == 'counts':
+            continue
+        grid.append({'model': model, 'ngram_range': tuple(ngram_range), 'alpha': alpha, 'features': feature,
+                     'balance': balance})
+    return grid
+
+
+def _share(shared):
+    _SHARED.update(shared)
+
+
+def _undersample(train, labels, seed):
+    # Every class cut down to the size of the smallest one in this training fold
+    rng = np.random.RandomState(seed)
+    size = np.bincount(labels[train], minlength=len(CATEGORIES))
+    size = size[size > 0].min()
+    keep = [rng.choice(train[labels[train] == code], size, replace=False)
+            for code in range(len(CATEGORIES)) if np.any(labels[train] == code)]
+    return np.sort(np.concatenate(keep))
+
+
+def _evaluate(task):
+    config, fold = task
+    corpus, labels, folds, seed = _SHARED['corpus'], _SHARED['labels'], _SHARED['folds'], _SHARED['seed']
+    test = folds[fold]
+    train = np.sort(np.concatenate([other for index, other in enumerate(folds) if index != fold]))
+    if config['balance'] == 'undersample':
+        train = _undersample(train, labels, seed + fold)
+    terms = corpus.terms()
+    vectorizer = Vectorizer(config['ngram_range'], binary=config['features'] == 'binary')
+    features = vectorizer.fit_transform_ids(*corpus.select(train), terms)
+    classifier = MODELS[config['model']](config['alpha'], fit_prior=config['balance'] != 'uniform')
+    classifier.fit(features, np.array(CATEGORIES)[labels[train]])
+    predicted = classifier.predict(vectorizer.transform_ids(*corpus.select(test), terms))
+    codes = {category: code for code, category in enumerate(CATEGORIES)}
+    predicted = np.array([codes[label] for label in predicted.tolist()], dtype=np.int64)
+    # confusion[predicted, actual], laid out like Bayesian.test
+    confusion = np.bincount(predicted * len(CATEGORIES) + labels[test], minlength=len(CATEGORIES) ** 2)
+    return confusion.reshape(len(CATEGORIES), len(CATEGORIES))
+
+
+def summarize(confusions):
+    confusions = np.asarray(confusions)
+    accuracy = np.trace(confusions, axis1=1, axis2=2) / confusions.sum(axis=(1, 2))
+    # Macro F1 over the three categories, a class never predicted nor present counts as 0
+    correct = np.diagonal(confusions, axis1=1, axis2=2)
+    predicted = confusions.sum(axis=2)
+    actual = confusions.sum(axis=1)
+    f1 = np.where(predicted + actual > 0, 2 * correct / np.maximum(predicted + actual, 1), 0).mean(axis=1)
+    return {
+        'accuracy_mean': float(accuracy.mean()),
+        'accuracy_std': float(accuracy.std()),
+        'macro_f1_mean': float(f1.mean()),
+        'macro_f1_std': float(f1.std())
+    }
+
+
+class CrossValidator:
+    # Every (configuration, fold) pair is one task, so a sweep keeps all workers busy until the end
+    def __init__(self, bayesian, folds=5, seed=0, workers=None):
+        self.bayesian = bayesian
+        self.corpus = bayesian._get_corpus()
+        # Decoded once here rather than in every worker
+        self.corpus.terms()
+        codes = {category: code for code, category in enumerate(CATEGORIES)}
+        ratings = list(self.corpus.ratings)
+        self.labels = np.array([codes[bayesian._get_category(rating)] for rating in ratings], dtype=np.int64)
+        self.folds = stratified_folds(self.corpus.ratings.codes, folds, seed)
+        self.seed = seed
+        self.workers = workers or multiprocessing.cpu_count()
+
+    def run(self, configs):
+        shared = {'corpus': self.corpus, 'labels': self.labels, 'folds': self.folds, 'seed': self.seed}
+        tasks = [(config, fold) for config in configs for fold in range(len(self.folds))]
+        if self.workers == 1:
+            _share(shared)
+            confusions = [_evaluate(task) for task in tasks]
+        else:
+            # Forked workers see the corpus copy-on-write, other start methods unpickle it once per worker
+            fork = 'fork' in multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork') if fork else None
+            if fork:
+                _share(shared)
+                gc.freeze()
+            try:
+                with ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                         initializer=None if fork else _share,
+                                         initargs=() if fork else (shared,)) as pool:
+                    confusions = list(pool.map(_evaluate, tasks))
+            finally:
+                if fork:
+                    gc.unfreeze()
+        _SHARED.clear()
+        results = []
+        for index, config in enumerate(configs):
+            matrices = confusions[index * len(self.folds):(index + 1) * len(self.folds)]
+            results.append({
+                'config': config,
+                'folds': [matrix.tolist() for matrix in matrices],
+                **summarize(matrices)
+            })
+        return results
+
+
+def table(results):
+    lines = [f"{'model':>12} {'ngrams':>7} {'alpha':>6} {'features':>9} {'balance':>12} "
+             f"{'accuracy':>15} {'macro f1':>15}"]
+    for result in sorted(results, key=lambda result: -result['accuracy_mean']):
+        config = result['config']
+        ngrams = '-'.join(str(n) for n in config['ngram_range'])
+        lines.append(
+            f"{config['model']:>12} {ngrams:>7} {config['alpha']:>6} {config['features']:>9} {config['balance']:>12} "
+            f"{result['accuracy_mean']:>8.3f} ±{result['accuracy_std']:.3f} "
+            f"{result['macro_f1_mean']:>8.3f} ±{result['macro_f1_std']:.3f}"
+        )
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stratified k-fold cross-validation sweep of the rating classifier')
+    parser.add_argument('--data', default=DATA_PATH, help='cleaned.pickle or a columnar directory')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='processes, defaults to the number of cores')
+    parser.add_argument('--models', nargs='+', choices=sorted(MODELS), default=sorted(MODELS))
+    parser.add_argument('--ngrams', nargs='+', default=['1-1', '1-2'], help='n-gram ranges as low-high')
+    parser.add_argument('--alphas', nargs='+', type=float, default=[0.1, 0.5, 1.0])
+    parser.add_argument('--features', nargs='+', choices=['counts', 'binary'], default=['counts', 'binary'])
+    parser.add_argument('--balance', nargs='+', choices=BALANCES, default=list(BALANCES))
+    parser.add_argument('--output', help='write every configuration with its per fold confusion matrices here')
+    args = parser.parse_args()
+
+    ngram_ranges = [tuple(int(n) for n in ngrams.split('-')) for ngrams in args.ngrams]
+    configs = configurations(args.models, ngram_ranges, args.alphas, args.features, args.balance)
+    validator = CrossValidator(Bayesian(serializer=pickle, data_path=args.data), args.folds, args.seed, args.workers)
+    print(len(configs), 'configurations x', args.folds, 'folds on', validator.workers, 'workers')
+    results = validator.run(configs)
+    print(table(results))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
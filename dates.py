@@ -0,0 +1,48 @@
+import datetime
+import re
+from collections import Counter
+from functools import lru_cache
+
+MONTHS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6, 'july': 7, 'august': 8,
+    'september': 9, 'october': 10, 'november': 11, 'december': 12
+}
+WEEKDAYS = {'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'}
+
+
+class DateParser:
+    # Parses politifact dates such as "on Monday, March 4th, 2019" with one precompiled regex,
+    # memoizing distinct raw strings since they repeat heavily across a crawl
+    pattern = re.compile(r'^\s*on\s+([a-z]+),\s+([a-z]+)\s+(\d{1,2})(?:st|nd|rd|th),\s+(\d{4})\s*$', re.IGNORECASE)
+
+    def __init__(self, cache_size=4096):
+        self.unparseable = Counter()
+        self.parse = lru_cache(maxsize=cache_size)(self._parse)
+
+    def __call__(self, date):
+        parsed = self.parse(date)
+        if parsed is None:
+            self.unparseable[date] += 1
+        return parsed
+
+    def _parse(self, date):
+        match = self.pattern.match(date) if isinstance(date, str) else None
+        if match is None:
+            return None
+        # Full day and month names only, like strptime's %A and %B
+        weekday, month, day, year = match.groups()
+        month = MONTHS.get(month.lower())
+        if month is None or weekday.lower() not in WEEKDAYS:
+            return None
+        try:
+            return datetime.datetime(int(year), month, int(day))
+        except ValueError:
+            return None
+
+    def report(self):
+        return {
+            'unparseable': sum(self.unparseable.values()),
+            'distinct': len(self.unparseable),
+            'examples': [date for date, _ in self.unparseable.most_common(5)],
+            'cache': self.parse.cache_info()._asdict()
+        }
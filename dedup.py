@@ -0,0 +1,100 @@
+import datetime
+import hashlib
+import re
+from operator import attrgetter
+
+KEYS = ('text', 'source')
+
+
+class Deduplicator:
+    # Works on Statement records. With keep_records=False only the id, date and `retain` fields of
+    # each kept record are held, so memory grows with distinct statements rather than full records
+    def __init__(self, keys=KEYS, normalize=False, hashed=False, keep_records=True, retain=()):
+        self.keys = keys
+        self._values = attrgetter(*keys)
+        self.normalize = normalize
+        self.hashed = hashed
+        self.keep_records = keep_records
+        self.retain = ('id', 'date') + tuple(retain)
+        self.index = {}
+        self.records = []
+        self.report = []
+        self.duplicates = 0
+        self.replaced = 0
+        self._whitespace = re.compile(r'\s+')
+        self._punctuation = re.compile(r'["“”‘’\'.,!?]')
+
+    def add(self, point, count):
+        # O(1) - one dict lookup per record instead of a scan over everything cleaned so far.
+        # Returns the record now kept for this key and the one it superseded, (None, None) when
+        # the point is an older duplicate
+        key = self._key(point)
+        position = self.index.get(key)
+        if position is None:
+            # The id is set on the record itself, no copy per statement
+            point.id = count
+            self._store(key, None, point)
+            return point, None
+        existing = self.records[position] if self.keep_records else position
+        # In case of duplicates, keep the one with the latest date since politifact can
+        # Reanalyze claims. Most recent one matters; older ones are ignored
+        replaced = self._is_later(point, existing)
+        self.duplicates += 1
+        self.replaced += replaced
+        if self.keep_records:
+            self.report.append({
+                'id': existing['id'],
+                'duplicate_id': count,
+                'text': point['text'],
+                'source': point['source'],
+                'kept_date': point['date'] if replaced else existing['date'],
+                'dropped_date': existing['date'] if replaced else point['date'],
+                'replaced': replaced
+            })
+        if not replaced:
+            return None, None
+        point.id = existing['id']
+        self._store(key, position, point)
+        return point, existing
+
+    def _store(self, key, position, record):
+        if not self.keep_records:
+            self.index[key] = {i: getattr(record, i) for i in self.retain}
+        elif position is None:
+            self.index[key] = len(self.records)
+            self.records.append(record)
+        else:
+            self.records[position] = record
+
+    def extend(self, points, start=0):
+        for count, point in enumerate(points, start):
+            self.add(point, count)
+        return self.records
+
+    def summary(self):
+        return {
+            'unique': len(self.index),
+            'duplicates': self.duplicates,
+            'replaced': self.replaced
+        }
+
+    def _key(self, point):
+        values = self._values(point)
+        values = values if isinstance(values, tuple) else (values,)
+        if self.normalize:
+            values = tuple(self._normalize(value) for value in values)
+        if self.hashed:
+            return hashlib.blake2b('\x1f'.join(values).encode('utf-8'), digest_size=16).digest()
+        return values
+
+    def _normalize(self, value):
+        value = self._punctuation.sub('', value.lower())
+        return self._whitespace.sub(' ', value).strip()
+
+    def _is_later(self, point, duplicate):
+        # Unparseable dates never displace a dated record
+        if point.date is None:
+            return False
+        if duplicate['date'] is None:
+            return True
+        return point.date - duplicate['date'] > datetime.timedelta(0)
@@ -0,0 +1,111 @@
+import argparse
+import functools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+SITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'site')
+
+
+class Faults:
+    # Injected into every request: latency seconds plus up to jitter more, then with probability error_rate a
+    # 503 (carrying Retry-After when retry_after is set). Urls containing any of `broken` always answer 500.
+    # Requests are logged with their start time so tests can check rate limits and concurrency
+    def __init__(self, latency=0, jitter=0, error_rate=0, broken=(), retry_after=None, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.broken = set(broken)
+        self.retry_after = retry_after
+        self.requests = []
+        self.in_flight = 0
+        self.peak = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def decide(self, path):
+        # (seconds to stall, error status or None) for one request
+        with self._lock:
+            self.requests.append((time.monotonic(), path))
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            if any(part in path for part in self.broken):
+                return delay, 500
+            return delay, 503 if self._random.random() < self.error_rate else None
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    # Serves the saved politifact pages; `?page=N` on a listing maps to its page-N.html
+    def __init__(self, *args, faults=None, **kwargs):
+        self.faults = faults
+        super().__init__(*args, **kwargs)
+
+    def handle_one_request(self):
+        if self.faults is None:
+            return super().handle_one_request()
+        with self.faults.track():
+            return super().handle_one_request()
+
+    def send_head(self):
+        if self.faults is not None:
+            delay, status = self.faults.decide(self.path)
+            time.sleep(delay)
+            if status:
+                self.send_response(status)
+                if status == 503 and self.faults.retry_after is not None:
+                    self.send_header('Retry-After', str(self.faults.retry_after))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+        return super().send_head()
+
+    def translate_path(self, path):
+        parts = urlsplit(path)
+        translated = super().translate_path(parts.path)
+        page = parse_qs(parts.query).get('page', ['1'])[0]
+        if page != '1' and os.path.isdir(translated):
+            return os.path.join(translated, f'page-{page}.html')
+        return translated
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=0, directory=SITE_PATH, faults=None):
+    # Starts the fixture site on a background thread, returns the server and its base url
+    handler = functools.partial(FixtureHandler, directory=directory, faults=faults)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the saved politifact fixture pages')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0, help='seconds every response is delayed')
+    parser.add_argument('--jitter', type=float, default=0, help='up to this many seconds more, at random')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of requests answered with a 503')
+    parser.add_argument('--broken', nargs='*', default=[], help='urls containing these always answer 500')
+    parser.add_argument('--retry-after', type=float, default=None, help='Retry-After seconds sent with a 503')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    faults = None
+    if args.latency or args.jitter or args.error_rate or args.broken:
+        faults = Faults(args.latency, args.jitter, args.error_rate, args.broken, args.retry_after, args.seed)
+    server, base = serve(args.port, faults=faults)
+    print('Serving fixtures at', base + 'personalities/')
+    threading.Event().wait()
@@ -1,18 +1,31 @@
-import re
+import argparse
 import nltk
 import pickle
 import pprint
+import numpy as np
 from nltk.classify import NaiveBayesClassifier
 
+import artifact
+import columnar
+from corpus import CACHE_DIR, Corpus, tokenize
+from metrics import Metrics
+from naive_bayes import MODELS
+from vectorize import Vectorizer, normalize
+
 DATA_PATH = 'data/cleaned.pickle'
 
 
 class Bayesian:
 
-    def __init__(self, serializer, data_path):
+    def __init__(self, serializer, data_path, columns=('text', 'affiliation', 'rating'), mmap=False, metrics=None,
+                 cache_dir=CACHE_DIR):
         self.serializer = serializer
+        self.metrics = metrics or Metrics()
         self.data_path = data_path
-        self.data = self.serializer.load(open(data_path, 'rb'))
+        # Columnar datasets only read the columns training uses
+        self.data = columnar.read(self.serializer, data_path, columns, mmap)
+        self.cache_dir = cache_dir
+        self.corpus = None
         self.positive_words = ['good', 'great', 'amazing', 'wonderful', 'best', 'awesome', 'outstanding',
                                'fantastic', 'terrific', 'nice']
         self.negative_words = ['bad', 'terrible', 'awful', 'ugly', 'horrible', 'horrid', 'disgusting', 'useless',
@@ -23,48 +36,88 @@ class Bayesian:
         self.negative_ratings = ['false', 'mostly false', 'pants on fire!', 'full flop']
         self.neutral_ratings = ['half-true', 'half flip']
 
+    def _get_corpus(self):
+        # Quote extraction and tokenization run once per dataset, later runs load them from cache_dir
+        if self.corpus is None:
+            self.corpus = Corpus.cached(self.data, self.cache_dir) if self.cache_dir else Corpus.build(self.data)
+        return self.corpus
+
     def _get_quote_data(self):
         # only care about quoted words
-        quoted = []
-        for claim in self.data:
-            for quote in re.findall(r'".*?"', claim['text']):
-                quoted.append({
-                    'text': quote,
-                    'affiliation': claim['affiliation'],
-                    'rating': claim['rating']
-                })
-        return quoted
+        return self._get_corpus().quotes()
 
     def _get_words(self, quote):
-        # return nltk.word_tokenize(quote)
-        return [i.lower() for i in quote.split(' ')]
+        return self.corpus.tokens(quote['index'])
+
+    def _get_ids(self, quotes):
+        return self.corpus.select([quote['index'] for quote in quotes])
 
     def word_features(self, words):
         return dict([(word, True) for word in words])
 
-    def train_ratings(self):
+    def _get_category(self, rating):
+        if rating in self.positive_ratings:
+            return 'true'
+        elif rating in self.negative_ratings:
+            return 'false'
+        elif rating in self.neutral_ratings:
+            return 'neutral'
+        raise Exception(f"Could not find category for quote with rating: {rating}")
+
+    def train_ratings(self, engine='nltk', model='multinomial', ngram_range=(1, 1), alpha=1.0):
+        with self.metrics.stage('train'):
+            self._train_ratings(engine, model, ngram_range, alpha)
+            self.metrics.count('quotes', len(self.quoted_data))
+            self.metrics.count('training_quotes', len(self.training_set))
+
+    def _train_ratings(self, engine, model, ngram_range, alpha):
+        self.engine = engine
+        with self.metrics.stage('quotes'):
+            self.quoted_data = self._get_quote_data()
+            training_set = self._get_training_set()
+        if engine == 'vectorized':
+            # Whole quotes as documents in a sparse count matrix instead of one feature dict per word
+            with self.metrics.stage('vectorize'):
+                self.vectorizer = Vectorizer(ngram_range, binary=model == 'bernoulli')
+                features = self.vectorizer.fit_transform_ids(*self._get_ids(training_set), self.corpus.terms())
+                labels = [self._get_category(quote['rating']) for quote in training_set]
+            with self.metrics.stage('fit'):
+                self.classifier = MODELS[model](alpha).fit(features, labels)
+            self.model = model
+            self.alpha = alpha
+            texts = [self.corpus.texts[quote['index']] for quote in training_set]
+            self.training_hash = artifact.data_hash(texts, labels)
+            return
+
         true_features = []
         false_features = []
         neutral_features = []
-        self.quoted_data = self._get_quote_data()
-        for quote in self._get_training_set():
-            for word in self._get_words(quote['text']):
-                if quote['rating'] in self.positive_ratings:
-                    true_features.append((self.word_features(word), 'true'))
-                elif quote['rating'] in self.negative_ratings:
-                    false_features.append((self.word_features(word), 'false'))
-                elif quote['rating'] in self.neutral_ratings:
-                    neutral_features.append((self.word_features(word), 'neutral'))
-                else:
-                    raise Exception(f"Could not find category for quote with rating: {quote['rating']}")
+        with self.metrics.stage('features'):
+            for quote in training_set:
+                for word in self._get_words(quote):
+                    if quote['rating'] in self.positive_ratings:
+                        true_features.append((self.word_features(word), 'true'))
+                    elif quote['rating'] in self.negative_ratings:
+                        false_features.append((self.word_features(word), 'false'))
+                    elif quote['rating'] in self.neutral_ratings:
+                        neutral_features.append((self.word_features(word), 'neutral'))
+                    else:
+                        raise Exception(f"Could not find category for quote with rating: {quote['rating']}")
 
         training_set = false_features + true_features + neutral_features
 
-        self.classifier = NaiveBayesClassifier.train(training_set)
+        with self.metrics.stage('fit'):
+            self.classifier = NaiveBayesClassifier.train(training_set)
+
+    def save_model(self, path):
+        if self.engine != 'vectorized':
+            raise Exception("Only vectorized models can be saved, train with engine='vectorized'")
+        artifact.save(path, self.vectorizer, self.classifier, self.model, self.alpha, self.training_hash)
 
     def train_sentiment(self):
+        self.engine = 'nltk'
         self.quoted_data = self._get_quote_data()
-        self.test_set = self._clean(self.quoted_data)
+        self.test_set = self.quoted_data
         positive_features = [(self.word_features(pos), 'true') for pos in self.positive_words]
         negative_features = [(self.word_features(neg), 'false') for neg in self.negative_words]
         neutral_features = [(self.word_features(neu), 'neutral') for neu in self.neutral_words]
@@ -79,7 +132,7 @@ class Bayesian:
         positive = 0
         negative = 0
         neutral = 0
-        for i in self._clean(self.quoted_data):
+        for i in self.quoted_data:
             if len(self.training_set) > len(self.quoted_data) // 2:
                 self.test_set.append(i)
             elif positive <= negative and positive <= neutral and i['rating'] in self.positive_ratings:
@@ -95,11 +148,6 @@ class Bayesian:
                 self.test_set.append(i)
         return self.training_set
 
-    def _clean(self, data):
-        for quote in data:
-            quote['text'] = quote['text'].replace('"', '').replace(',', '').replace('.', '').lower()
-        return data
-
     def test(self):
         data = {
             'correct': 0,
@@ -117,65 +165,83 @@ class Bayesian:
             'negative_predictions': 0,
             'neutral_predictions': 0,
         }
-        for quote in self.test_set:
-            result = self.test_quote(quote['text'])
-            if result['true'] > result['false']:
-                prediction = 'true'
-                data['positive_predictions'] += 1
-            elif result['true'] < result['false']:
-                prediction = 'false'
-                data['negative_predictions'] += 1
+        categories = ['true', 'false', 'neutral']
+        names = {'true': ('positive', 'pos'), 'false': ('negative', 'neg'), 'neutral': ('neutral', 'neut')}
+        with self.metrics.stage('test'):
+            if self.engine == 'vectorized':
+                features = self.vectorizer.transform_ids(*self._get_ids(self.test_set), self.corpus.terms())
+                predictions = self.classifier.predict(features)
             else:
-                prediction = 'neutral'
-                data['neutral_predictions'] += 1
-
-            if prediction == 'true' and quote['rating'] in self.positive_ratings:
-                data['correct'] += 1
-                data['correct_positive'] += 1
-            elif prediction == 'false' and quote['rating'] in self.negative_ratings:
-                data['correct'] += 1
-                data['correct_negative'] += 1
-            elif prediction == 'neutral' and quote['rating'] in self.neutral_ratings:
-                data['correct'] += 1
-                data['correct_neutral'] += 1
-            elif prediction == 'false' and quote['rating'] in self.positive_ratings:
-                data['incorrect_p_neg_actual_pos'] += 1
-                data['incorrect'] += 1
-            elif prediction == 'false' and quote['rating'] in self.neutral_ratings:
-                data['incorrect_p_neg_actual_neut'] += 1
-                data['incorrect'] += 1
-            elif prediction == 'neutral' and quote['rating'] in self.positive_ratings:
-                data['incorrect_p_neut_actual_pos'] += 1
-                data['incorrect'] += 1
-            elif prediction == 'neutral' and quote['rating'] in self.negative_ratings:
-                data['incorrect_p_neut_actual_neg'] += 1
-                data['incorrect'] += 1
-            elif prediction == 'true' and quote['rating'] in self.negative_ratings:
-                data['incorrect_p_pos_actual_neg'] += 1
-                data['incorrect'] += 1
-            elif prediction == 'true' and quote['rating'] in self.neutral_ratings:
-                data['incorrect_p_pos_actual_neut'] += 1
-                data['incorrect'] += 1
-            else:
-                data['incorrect'] += 1
-
+                predictions = self._predict_tokens([self._get_words(quote) for quote in self.test_set])
+            self.metrics.count('test_quotes', len(self.test_set))
+        actual = np.array([self._get_category(quote['rating']) for quote in self.test_set])
+        # confusion[predicted, actual] over the three categories
+        confusion = np.zeros((len(categories), len(categories)), dtype=np.int64)
+        for p, predicted in enumerate(categories):
+            for a, category in enumerate(categories):
+                confusion[p, a] = np.count_nonzero((predictions == predicted) & (actual == category))
+
+        for p, predicted in enumerate(categories):
+            data[f'{names[predicted][0]}_predictions'] = int(confusion[p].sum())
+            for a, category in enumerate(categories):
+                if p == a:
+                    data[f'correct_{names[predicted][0]}'] = int(confusion[p, a])
+                else:
+                    data[f'incorrect_p_{names[predicted][1]}_actual_{names[category][1]}'] = int(confusion[p, a])
+        data['correct'] = int(np.trace(confusion))
+        data['incorrect'] = len(self.test_set) - data['correct']
         return data
 
-    def test_quote(self, quote):
-        words = quote.split(' ')
-        neg = 0
-        pos = 0
-        for word in words:
-            class_result = self.classifier.classify(self.word_features(word.lower()))
-            if class_result == 'false':
-                neg = neg + 1
-            if class_result == 'true':
-                pos = pos + 1
-        return {
-            'true': pos / len(words),
-            'false': neg / len(words)
-        }
+    def score_batch(self, texts):
+        # Returns the class labels and an array of per class scores, one row per text. Texts get the
+        # normalization training quotes got, so raw quotes score the same as in test()
+        return self._score_tokens([tokenize(normalize(text)) for text in texts])
+
+    def predict_batch(self, texts):
+        return self._predict_tokens([tokenize(normalize(text)) for text in texts])
+
+    def _score_tokens(self, words):
+        if self.engine == 'vectorized':
+            return self.classifier.classes, self.classifier.predict_proba(self.vectorizer.transform_tokens(words))
+
+        # Classify each distinct word of the batch once, then count votes per text
+        classified = {}
+        for word in {word for text in words for word in text}:
+            classified[word] = self.classifier.classify(self.word_features(word))
+        classes = np.array(['true', 'false', 'neutral'])
+        codes = {label: index for index, label in enumerate(classes)}
+        rows = np.repeat(np.arange(len(words)), [len(text) for text in words])
+        votes = np.array([codes[classified[word]] for text in words for word in text], dtype=np.int64)
+        counts = np.bincount(rows * len(classes) + votes, minlength=len(words) * len(classes))
+        counts = counts.reshape(len(words), len(classes))
+        return classes, counts / np.maximum([len(text) for text in words], 1)[:, None]
+
+    def _predict_tokens(self, words):
+        classes, scores = self._score_tokens(words)
+        if self.engine == 'vectorized':
+            return classes[np.argmax(scores, axis=1)]
+        # Per-word voting: the larger of the true and false shares wins, ties are neutral
+        true, false = scores[:, 0], scores[:, 1]
+        return np.where(true > false, 'true', np.where(true < false, 'false', 'neutral'))
 
-b = Bayesian(serializer=pickle, data_path=DATA_PATH)
-b.train_ratings()
-pprint.pprint(b.test())
+    def test_quote(self, quote):
+        classes, scores = self.score_batch([quote])
+        return dict(zip(classes.tolist(), scores[0].tolist()))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train and test the rating classifier')
+    parser.add_argument('--data', default=DATA_PATH, help='cleaned.pickle or a columnar directory')
+    parser.add_argument('--engine', choices=['nltk', 'vectorized'], default='nltk')
+    parser.add_argument('--model', choices=sorted(MODELS), default='multinomial')
+    parser.add_argument('--save', help='write the trained vectorized model artifact (.npz) here')
+    parser.add_argument('--metrics', help='write a JSON report of stage timings and counters here')
+    parser.add_argument('--profile', action='store_true', help='run stages under cProfile, needs --metrics')
+    args = parser.parse_args()
+    metrics = Metrics(enabled=bool(args.metrics), profile=args.profile)
+    with metrics.stage('load'):
+        b = Bayesian(serializer=pickle, data_path=args.data, metrics=metrics)
+    b.train_ratings(engine=args.engine, model=args.model)
+    pprint.pprint(b.test())
+    if args.save:
+        b.save_model(args.save)
+    metrics.write(args.metrics)
@@ -0,0 +1,166 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Upper bounds in seconds for latency histograms, the last bucket catches everything slower
+BUCKETS = [0.1, 0.25, 0.5, 1, 2, 5, 10, 15, 30, float('inf')]
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def report(self):
+        return {
+            'count': self.total,
+            'sum': self.sum,
+            'mean': self.sum / self.total if self.total else None,
+            'min': self.min,
+            'max': self.max,
+            'buckets': {('+inf' if bound == float('inf') else str(bound)): count
+                        for bound, count in zip(self.buckets, self.counts)}
+        }
+
+
+class Metrics:
+    # Opt-in: a disabled instance (the default everywhere) makes every call a cheap no-op.
+    # Stages nest, so 'clean/dedup' is the dedup step inside the clean stage. Pool threads that
+    # have not entered a stage of their own report into the stage most recently entered
+    def __init__(self, enabled=False, profile=False, profile_limit=25):
+        self.enabled = enabled
+        self.profile = profile
+        self.profile_limit = profile_limit
+        self.stages = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._last = None
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _current(self):
+        stack = self._stack()
+        return stack[-1] if stack else self._last or 'run'
+
+    def _stage(self, name):
+        if name not in self.stages:
+            # ru_maxrss only ever rises, so a stage gets how far it raised the process high water mark
+            # and the mark itself when it ended, not a peak of its own
+            self.stages[name] = {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_growth_kb': None,
+                                 'process_peak_rss_kb': None, 'counts': OrderedDict(), 'histograms': OrderedDict()}
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name, profile=None):
+        if not self.enabled:
+            yield
+            return
+        stack = self._stack()
+        parent = stack[-1] if stack else self._last
+        full_name = '/'.join([parent, name]) if parent else name
+        profiler = None
+        # Only the outermost profiled stage of a thread runs a profiler, nested stages show up inside its
+        # profile. Python 3.12 allows one profiler per process, so a stage that cannot start one goes without
+        if (self.profile if profile is None else profile) and not getattr(self._local, 'profiling', False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                self._local.profiling = True
+            except ValueError:
+                profiler = None
+        stack.append(full_name)
+        self._last = full_name
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        rss = peak_rss_kb()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                self._local.profiling = False
+            stack.pop()
+            self._last = parent
+            with self._lock:
+                stage = self._stage(full_name)
+                stage['calls'] += 1
+                stage['wall_seconds'] += time.perf_counter() - wall
+                stage['cpu_seconds'] += time.process_time() - cpu
+                stage['process_peak_rss_kb'] = peak_rss_kb()
+                if rss is not None:
+                    growth = stage['process_peak_rss_kb'] - rss
+                    stage['peak_rss_growth_kb'] = (stage['peak_rss_growth_kb'] or 0) + growth
+                if profiler:
+                    stage['profile'] = self._summarize(profiler)
+
+    def _summarize(self, profiler):
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(self.profile_limit)
+        return output.getvalue().splitlines()
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self._lock:
+                counts = self._stage(self._current())['counts']
+                counts[name] = counts.get(name, 0) + value
+
+    def observe(self, name, value):
+        if self.enabled:
+            with self._lock:
+                histograms = self._stage(self._current())['histograms']
+                histograms.setdefault(name, Histogram()).observe(value)
+
+    @contextmanager
+    def timer(self, name):
+        # Observes the wall time of the block into the `name` histogram of the current stage
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def report(self):
+        stages = OrderedDict()
+        for name, stage in self.stages.items():
+            stages[name] = {**stage, **{
+                'histograms': {key: value.report() for key, value in stage['histograms'].items()}
+            }}
+        return {'peak_rss_kb': peak_rss_kb(), 'stages': stages}
+
+    def write(self, path):
+        if self.enabled:
+            with open(path, 'w') as file:
+                json.dump(self.report(), file, indent=2)
@@ -0,0 +1,79 @@
+import numpy as np
+
+
+def _logsumexp(values):
+    peak = values.max(axis=1, keepdims=True)
+    return peak + np.log(np.exp(values - peak).sum(axis=1, keepdims=True))
+
+
+class MultinomialNB:
+    # Naive Bayes over term counts, trained and applied as array operations on a CSRMatrix
+    def __init__(self, alpha=1.0, fit_prior=True):
+        self.alpha = alpha
+        # Without fit_prior every class gets the same prior, a cheap counter to imbalanced ratings
+        self.fit_prior = fit_prior
+
+    def _log_prior(self, class_count):
+        if not self.fit_prior:
+            return np.full(len(class_count), -np.log(len(class_count)))
+        return np.log(class_count) - np.log(class_count.sum())
+
+    def _count(self, X, codes):
+        # Per class sum of every feature in one bincount over (class, feature) pairs
+        n_classes = len(self.classes)
+        combined = codes[X.row_ids()] * X.shape[1] + X.indices
+        counts = np.bincount(combined, weights=X.data, minlength=n_classes * X.shape[1])
+        return counts.reshape(n_classes, X.shape[1])
+
+    def fit(self, X, y):
+        self.classes, codes = np.unique(np.asarray(y), return_inverse=True)
+        class_count = np.bincount(codes, minlength=len(self.classes))
+        self.class_log_prior = self._log_prior(class_count)
+        # Laplace smoothed log P(feature | class)
+        smoothed = self._count(X, codes) + self.alpha
+        self.feature_log_prob = np.log(smoothed) - np.log(smoothed.sum(axis=1, keepdims=True))
+        return self
+
+    def joint_log_likelihood(self, X):
+        weights = self.feature_log_prob[:, X.indices] * X.data
+        rows = X.row_ids()
+        jll = np.stack([np.bincount(rows, weights=w, minlength=X.shape[0]) for w in weights], axis=1)
+        return jll + self.class_log_prior
+
+    def predict_log_proba(self, X):
+        jll = self.joint_log_likelihood(X)
+        return jll - _logsumexp(jll)
+
+    def predict_proba(self, X):
+        return np.exp(self.predict_log_proba(X))
+
+    def predict(self, X):
+        return self.classes[np.argmax(self.joint_log_likelihood(X), axis=1)]
+
+
+class BernoulliNB(MultinomialNB):
+    # Naive Bayes over term presence, absent terms also contribute evidence
+    def fit(self, X, y):
+        X = X.binarize()
+        self.classes, codes = np.unique(np.asarray(y), return_inverse=True)
+        class_count = np.bincount(codes, minlength=len(self.classes))
+        self.class_log_prior = self._log_prior(class_count)
+        probability = (self._count(X, codes) + self.alpha) / (class_count[:, None] + 2 * self.alpha)
+        self.feature_log_prob = np.log(probability)
+        self.feature_log_neg_prob = np.log1p(-probability)
+        return self
+
+    def joint_log_likelihood(self, X):
+        X = X.binarize()
+        weights = self.feature_log_prob - self.feature_log_neg_prob
+        rows = X.row_ids()
+        present = np.stack(
+            [np.bincount(rows, weights=w[X.indices], minlength=X.shape[0]) for w in weights], axis=1
+        )
+        return present + self.feature_log_neg_prob.sum(axis=1) + self.class_log_prior
+
+
+MODELS = {
+    'multinomial': MultinomialNB,
+    'bernoulli': BernoulliNB
+}
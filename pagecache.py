@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from metrics import Metrics
+
+CACHE_PATH = 'data/pages'
+TTL = 24 * 60 * 60
+MAX_BYTES = 512 * 1024 * 1024
+
+
+class PageCache:
+    # Fetched pages on disk keyed by url, <key>.html holds the body and <key>.json the final url, ETag,
+    # Last-Modified and fetch time. Entries younger than ttl are served without a request, older ones
+    # are revalidated with a conditional request. Past max_bytes the least recently used are evicted,
+    # recency is the body's mtime so it carries over between runs. Offline serves only from disk
+    def __init__(self, path=CACHE_PATH, ttl=TTL, max_bytes=MAX_BYTES, offline=False, metrics=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.metrics = metrics or Metrics()
+        self.entries = {}
+        self.size = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):
+            if name.endswith('.json'):
+                self._load(name[:-len('.json')])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _paths(self, key):
+        return os.path.join(self.path, key + '.html'), os.path.join(self.path, key + '.json')
+
+    def _load(self, key):
+        body_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as file:
+                entry = json.load(file)
+            entry['key'] = key
+            entry['used'] = os.path.getmtime(body_path)
+            entry['body_size'] = os.path.getsize(body_path)
+            entry['size'] = entry['body_size'] + os.path.getsize(meta_path)
+        except (OSError, ValueError):
+            # Interrupted between writing the body and its metadata
+            self._remove(key)
+            return
+        self.entries[entry['url']] = entry
+        self.size += entry['size']
+
+    def _write(self, path, data):
+        with open(path + '.tmp', 'wb') as file:
+            file.write(data)
+        os.replace(path + '.tmp', path)
+
+    def _write_meta(self, entry):
+        meta = {field: entry[field] for field in ('url', 'final_url', 'etag', 'last_modified', 'fetched')}
+        data = json.dumps(meta).encode('utf-8')
+        self._write(self._paths(entry['key'])[1], data)
+        return len(data)
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def get(self, url, fetch):
+        # fetch(url, headers) -> (status, body, final url, response headers), a 304 status has no body
+        with self._lock:
+            entry = self.entries.get(url)
+            if self.offline:
+                if entry is None:
+                    self.metrics.count('cache_misses')
+                    raise LookupError(f'{url} is not in the page cache at {self.path}')
+                self.metrics.count('cache_hits')
+                return self._read(entry)
+            if entry and time.time() - entry['fetched'] < self.ttl:
+                self.metrics.count('cache_hits')
+                return self._read(entry)
+        headers = {}
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        status, body, final_url, response_headers = fetch(url, headers)
+        if status == 304:
+            with self._lock:
+                entry = self.entries.get(url)
+                if entry:
+                    self.metrics.count('cache_revalidated')
+                    entry['fetched'] = time.time()
+                    entry['etag'] = response_headers.get('ETag') or entry['etag']
+                    entry['last_modified'] = response_headers.get('Last-Modified') or entry['last_modified']
+                    self.size -= entry['size']
+                    entry['size'] = entry['body_size'] + self._write_meta(entry)
+                    self.size += entry['size']
+                    return self._read(entry)
+            # Evicted by another thread while it was being revalidated
+            status, body, final_url, response_headers = fetch(url, {})
+        with self._lock:
+            self.metrics.count('cache_misses')
+            self._store(url, body, final_url, response_headers)
+        return body, final_url
+
+    def _read(self, entry):
+        body_path = self._paths(entry['key'])[0]
+        with open(body_path, 'rb') as file:
+            body = file.read().decode('utf-8')
+        os.utime(body_path)
+        entry['used'] = time.time()
+        return body, entry['final_url']
+
+    def _store(self, url, body, final_url, headers):
+        old = self.entries.pop(url, None)
+        if old:
+            self.size -= old['size']
+        entry = {
+            'key': hashlib.sha256(url.encode('utf-8')).hexdigest()[:32],
+            'url': url,
+            'final_url': final_url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched': time.time(),
+            'used': time.time()
+        }
+        data = body.encode('utf-8')
+        self._write(self._paths(entry['key'])[0], data)
+        entry['body_size'] = len(data)
+        entry['size'] = entry['body_size'] + self._write_meta(entry)
+        self.entries[url] = entry
+        self.size += entry['size']
+        self._evict(keep=url)
+
+    def _evict(self, keep):
+        if self.size <= self.max_bytes:
+            return
+        for entry in sorted(self.entries.values(), key=lambda entry: entry['used']):
+            if self.size <= self.max_bytes:
+                break
+            if entry['url'] == keep:
+                continue
+            del self.entries[entry['url']]
+            self.size -= entry['size']
+            self._remove(entry['key'])
+            self.metrics.count('cache_evictions')
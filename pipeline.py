@@ -0,0 +1,67 @@
+import argparse
+import pickle
+
+from aggregate import RunningAggregator
+from analyze import Analyze
+from clean import Clean
+from crawl import CHECKPOINT_PATH, ROOT, Crawler, ParallelCrawler
+from metrics import Metrics
+
+
+class Pipeline:
+    # Streams statements from the crawler through per-record cleaning into running aggregates. Nothing
+    # holds the raw records, memory grows with distinct statements: one dedup key each, a 16 byte
+    # digest when the cleaner is hashed, and the few fields the aggregates need
+    def __init__(self, crawler, cleaner, analyzer, chart_every=None, metrics=None):
+        self.metrics = metrics or Metrics()
+        self.crawler = crawler
+        self.cleaner = cleaner
+        self.analyzer = analyzer
+        self.aggregator = analyzer.aggregator
+        self.chart_every = chart_every
+
+    def run(self, open_html=False):
+        count = 0
+        # Crawling, cleaning and aggregation interleave record by record, so they share one stage
+        with self.metrics.stage('pipeline'):
+            for kept, superseded in self.cleaner.stream(self.crawler.stream()):
+                self.aggregator.update(kept, superseded)
+                count += 1
+                self.metrics.count('superseded', superseded is not None)
+                # Charts refresh while the crawl is still running, unchanged ones are cache hits
+                if self.chart_every and count % self.chart_every == 0:
+                    self.analyzer.build_charts(open_html=False)
+            self.metrics.count('kept', count)
+            self.analyzer.build_charts(open_html=open_html)
+        return self.aggregator
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Crawl, clean and chart in one streaming pass')
+    parser.add_argument('--workers', type=int, default=4, help='size of the worker pool, 0 uses the browser crawler')
+    parser.add_argument('--root', default=ROOT)
+    parser.add_argument('--fixtures', action='store_true', help='crawl the saved pages in fixtures/ instead')
+    parser.add_argument('--checkpoint', default=CHECKPOINT_PATH)
+    parser.add_argument('--chart-every', type=int, default=None, help='re-render charts every N kept statements')
+    parser.add_argument('--charts', default='charts')
+    parser.add_argument('--metrics', help='write a JSON report of stage timings and counters here')
+    parser.add_argument('--profile', action='store_true', help='run stages under cProfile, needs --metrics')
+    args = parser.parse_args()
+    metrics = Metrics(enabled=bool(args.metrics), profile=args.profile)
+
+    if args.fixtures:
+        from fixtures.server import serve
+        server, base = serve()
+        args.root = base + 'personalities/'
+    if args.workers:
+        crawler = ParallelCrawler(serializer=pickle, workers=args.workers, root=args.root,
+                                  checkpoint_path=args.checkpoint, metrics=metrics)
+    else:
+        crawler = Crawler(serializer=pickle, checkpoint_path=args.checkpoint, root=args.root, metrics=metrics)
+    aggregator = RunningAggregator().track('rating').track('rating', 'affiliation')
+    analyzer = Analyze(serializer=pickle, data_path=None, charts_path=args.charts, aggregator=aggregator,
+                       metrics=metrics)
+    cleaner = Clean(serializer=pickle, raw_path=None, hashed=True, metrics=metrics)
+    Pipeline(crawler, cleaner, analyzer, args.chart_every, metrics).run()
+    print(len(aggregator), 'statements', dict(aggregator.counts('rating')))
+    metrics.write(args.metrics)
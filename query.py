@@ -0,0 +1,366 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import re
+from collections import OrderedDict
+
+import numpy as np
+
+import columnar
+
+VERSION = 2
+FIELDS = ('source', 'affiliation', 'rating', 'edition')
+TOKEN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+EMPTY = np.zeros(0, dtype=np.int64)
+NAT = int(np.datetime64('NaT', 's').astype(np.int64))
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def index_path(data_path):
+    # data/cleaned.pickle and the columnar data/cleaned both index into data/cleaned.index
+    return os.path.splitext(data_path.rstrip('/'))[0] + '.index'
+
+
+def _seconds(value):
+    # Dates are kept as int64 seconds, the same bits as datetime64[s], so a missing date is NaT
+    return int(np.datetime64(value, 's').astype(np.int64)) if value is not None else NAT
+
+
+def _sort_key(seconds):
+    # NaT is the smallest int64, moved to the largest so it sorts after every date on any numpy version
+    return np.where(seconds == NAT, np.iinfo(np.int64).max, seconds)
+
+
+def _key(record):
+    # The cleaned id is a position in the crawl and moves when a re-crawl adds or drops statements,
+    # text and source are what deduplication keeps unique
+    return hashlib.blake2b('\x1f'.join((record['text'], record['source'])).encode('utf-8'), digest_size=16).digest()
+
+
+def _contains(tokens, phrase):
+    size = len(phrase)
+    return any(tokens[i:i + size] == phrase for i in range(len(tokens) - size + 1))
+
+
+class Postings:
+    # Sorted row lists per code: a persisted base (one rows array plus offsets) and rows added since
+    def __init__(self, rows=EMPTY, offsets=None):
+        self.rows = rows
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self.added = {}
+
+    def append(self, code, row):
+        self.added.setdefault(code, []).append(row)
+
+    def get(self, code):
+        base = self.rows[self.offsets[code]:self.offsets[code + 1]] if code < len(self.offsets) - 1 else EMPTY
+        added = self.added.get(code)
+        return np.concatenate([base, np.array(added, dtype=np.int64)]) if added else base
+
+    def compact(self, size):
+        lists = [self.get(code) for code in range(size)]
+        self.offsets = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum([len(rows) for rows in lists], out=self.offsets[1:])
+        self.rows = np.concatenate(lists) if lists else EMPTY
+        self.added = {}
+
+
+def _version(path):
+    # None when there is no index yet, an index of an older version is rebuilt
+    try:
+        with open(os.path.join(path, 'meta.json')) as file:
+            return json.load(file)['version']
+    except FileNotFoundError:
+        return None
+
+
+class Index:
+    # Rows are append only and keyed by the statement's text and source. A re-rated statement has its
+    # old row marked dead and the new version appended, so no posting list ever has to be rewritten.
+    # When only its id moved the row is kept and just the id updated
+    def __init__(self):
+        self.keys = []
+        self.ids = []
+        self.alive = []
+        self.dates = []
+        self.values = {field: [] for field in FIELDS}
+        self.lookup = {field: {} for field in FIELDS}
+        self.codes = {field: [] for field in FIELDS}
+        self.postings = {field: Postings() for field in FIELDS}
+        self.tokens = []
+        self.token_lookup = {}
+        self.token_postings = Postings()
+        self.rows_by_key = {}
+        self.records = {}
+        self.dirty = False
+        self._arrays = None
+
+    def __len__(self):
+        return len(self.rows_by_key)
+
+    def _code(self, field, value):
+        lookup = self.lookup[field]
+        if value not in lookup:
+            lookup[value] = len(self.values[field])
+            self.values[field].append(value)
+        return lookup[value]
+
+    def _signature(self, row):
+        return (self.dates[row], *(self.values[field][self.codes[field][row]] for field in FIELDS))
+
+    def add(self, record, key=None):
+        # Returns True when the record was new or changed and had to be indexed
+        key = key or _key(record)
+        self.records[record['id']] = record
+        old = self.rows_by_key.get(key)
+        if old is not None:
+            if self._signature(old) == (_seconds(record['date']), *(record[field] for field in FIELDS)):
+                if self.ids[old] != record['id']:
+                    self.ids[old] = record['id']
+                    self.dirty = True
+                    self._arrays = None
+                return False
+            self.alive[old] = False
+        row = len(self.ids)
+        self.rows_by_key[key] = row
+        self.keys.append(key)
+        self.ids.append(record['id'])
+        self.alive.append(True)
+        self.dates.append(_seconds(record['date']))
+        for field in FIELDS:
+            code = self._code(field, record[field])
+            self.codes[field].append(code)
+            self.postings[field].append(code, row)
+        for token in set(tokenize(record['text'])):
+            if token not in self.token_lookup:
+                self.token_lookup[token] = len(self.tokens)
+                self.tokens.append(token)
+            self.token_postings.append(self.token_lookup[token], row)
+        self.dirty = True
+        self._arrays = None
+        return True
+
+    def update(self, records):
+        # records is the whole cleaned data. Only new or re-rated statements are indexed, the rest is a
+        # dict lookup per record, and rows of statements no longer in it are marked dead.
+        # Returns the number of statements indexed and removed
+        self.records = {}
+        seen = set()
+        indexed = 0
+        for record in records:
+            key = _key(record)
+            seen.add(key)
+            indexed += self.add(record, key)
+        removed = self.rows_by_key.keys() - seen
+        for key in removed:
+            self.alive[self.rows_by_key.pop(key)] = False
+        if removed:
+            self.dirty = True
+            self._arrays = None
+        return indexed, len(removed)
+
+    def arrays(self):
+        if self._arrays is None:
+            dates = np.array(self.dates, dtype=np.int64)
+            self._arrays = {
+                'ids': np.array(self.ids, dtype=np.int64),
+                'alive': np.array(self.alive, dtype=bool),
+                'dates': dates.view('datetime64[s]'),
+                # NaT sorts last, so dated rows are a prefix of the order
+                'date_order': np.argsort(_sort_key(dates), kind='mergesort'),
+                'codes': {field: np.array(self.codes[field], dtype=np.int64) for field in FIELDS}
+            }
+        return self._arrays
+
+    def query(self):
+        return Query(self)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        arrays = self.arrays()
+        meta = {'version': VERSION, 'rows': len(self.ids), 'values': self.values, 'tokens': self.tokens}
+        keys = np.frombuffer(b''.join(self.keys), dtype=np.uint8).reshape(len(self.keys), 16)
+        np.save(os.path.join(path, 'keys.npy'), keys)
+        np.save(os.path.join(path, 'ids.npy'), arrays['ids'])
+        np.save(os.path.join(path, 'alive.npy'), arrays['alive'])
+        np.save(os.path.join(path, 'dates.npy'), arrays['dates'])
+        np.save(os.path.join(path, 'date_order.npy'), arrays['date_order'])
+        for field, postings, size in [*((field, self.postings[field], len(self.values[field])) for field in FIELDS),
+                                      ('text', self.token_postings, len(self.tokens))]:
+            postings.compact(size)
+            np.save(os.path.join(path, f'{field}.rows.npy'), postings.rows)
+            np.save(os.path.join(path, f'{field}.offsets.npy'), postings.offsets)
+            if field != 'text':
+                np.save(os.path.join(path, f'{field}.codes.npy'), arrays['codes'][field])
+        with open(os.path.join(path, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path, records=None):
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        if meta['version'] != VERSION:
+            raise ValueError(f"Unsupported index version {meta['version']} in {path}")
+        index = cls()
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy')) for name in ('ids', 'alive', 'dates', 'date_order')}
+        index.ids = arrays['ids'].tolist()
+        index.alive = arrays['alive'].tolist()
+        index.dates = arrays['dates'].view(np.int64).tolist()
+        keys = np.load(os.path.join(path, 'keys.npy')).tobytes()
+        index.keys = [keys[row * 16:row * 16 + 16] for row in range(len(index.ids))]
+        index.rows_by_key = {key: row for row, key in enumerate(index.keys) if index.alive[row]}
+        arrays['codes'] = {}
+        for field in FIELDS:
+            index.values[field] = meta['values'][field]
+            index.lookup[field] = {value: code for code, value in enumerate(index.values[field])}
+            arrays['codes'][field] = np.load(os.path.join(path, f'{field}.codes.npy'))
+            index.codes[field] = arrays['codes'][field].tolist()
+            index.postings[field] = Postings(np.load(os.path.join(path, f'{field}.rows.npy')),
+                                             np.load(os.path.join(path, f'{field}.offsets.npy')))
+        index.tokens = meta['tokens']
+        index.token_lookup = {token: code for code, token in enumerate(index.tokens)}
+        index.token_postings = Postings(np.load(os.path.join(path, 'text.rows.npy')),
+                                        np.load(os.path.join(path, 'text.offsets.npy')))
+        index._arrays = arrays
+        if records is not None:
+            index.records = {record['id']: record for record in records}
+        return index
+
+    @classmethod
+    def open(cls, serializer, data_path, records=None, save=True):
+        # Loads the index persisted next to the cleaned data and indexes whatever was appended since
+        records = records if records is not None else columnar.read(serializer, data_path)
+        path = index_path(data_path)
+        index = cls.load(path) if _version(path) == VERSION else cls()
+        indexed, removed = index.update(records)
+        if len(index) != len(index.records):
+            raise Exception(f'Index at {path} has {len(index)} statements for {len(index.records)} records')
+        if index.dirty and save:
+            index.save(path)
+        print(indexed, 'statements indexed,', removed, 'removed')
+        return index
+
+
+class Query:
+    # Filters only collect candidate row arrays, they are intersected smallest first when rows are read
+    def __init__(self, index, candidates=(), phrases=()):
+        self.index = index
+        self.candidates = candidates
+        self.phrases = phrases
+
+    def _with(self, rows, phrase=None):
+        return Query(self.index, self.candidates + (rows,), self.phrases + ((phrase,) if phrase else ()))
+
+    def where(self, **fields):
+        # where(rating='false') or where(rating=['false', 'pants on fire!']) for any of several values
+        query = self
+        for field, value in fields.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            lookup = self.index.lookup[field]
+            rows = [self.index.postings[field].get(lookup[value]) for value in values if value in lookup]
+            query = query._with(np.unique(np.concatenate(rows)) if len(rows) > 1 else rows[0] if rows else EMPTY)
+        return query
+
+    def contains(self, phrase):
+        tokens = tokenize(phrase)
+        query = self
+        for token in tokens:
+            code = self.index.token_lookup.get(token)
+            query = query._with(self.index.token_postings.get(code) if code is not None else EMPTY)
+        return Query(query.index, query.candidates, query.phrases + (tokens,)) if len(tokens) > 1 else query
+
+    def between(self, start=None, end=None):
+        # Half open [start, end) over the sorted date index
+        arrays = self.index.arrays()
+        ordered = _sort_key(arrays['dates'].view(np.int64)[arrays['date_order']])
+        low = np.searchsorted(ordered, _seconds(start)) if start else 0
+        high = np.searchsorted(ordered, _seconds(end)) if end else np.count_nonzero(ordered != np.iinfo(np.int64).max)
+        return self._with(np.sort(arrays['date_order'][low:high]))
+
+    def year(self, year):
+        return self.between(datetime.datetime(year, 1, 1), datetime.datetime(year + 1, 1, 1))
+
+    @property
+    def rows(self):
+        arrays = self.index.arrays()
+        if self.candidates:
+            candidates = sorted(self.candidates, key=len)
+            rows = candidates[0]
+            for other in candidates[1:]:
+                if not len(rows):
+                    break
+                rows = np.intersect1d(rows, other, assume_unique=True)
+        else:
+            rows = np.arange(len(arrays['alive']))
+        rows = rows[arrays['alive'][rows]]
+        if self.phrases and self.index.records:
+            # Tokens were matched through the index, only the surviving rows are checked for word order
+            ids = arrays['ids'][rows]
+            keep = [all(_contains(tokenize(self.index.records[id]['text']), phrase) for phrase in self.phrases)
+                    for id in ids.tolist()]
+            rows = rows[np.array(keep, dtype=bool)] if keep else rows
+        return rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def ids(self):
+        return self.index.arrays()['ids'][self.rows]
+
+    def records(self):
+        return [self.index.records[id] for id in self.ids().tolist()]
+
+    def group(self, field, by=None):
+        # Counts per value of `field`, nested per value of `by` when given, most common first
+        rows = self.rows
+        codes = self.index.arrays()['codes']
+        values = self.index.values[field]
+        if by is None:
+            counts = np.bincount(codes[field][rows], minlength=len(values))
+            return OrderedDict((values[code], int(counts[code])) for code in np.argsort(-counts, kind='mergesort')
+                               if counts[code])
+        groups = self.index.values[by]
+        matrix = np.bincount(codes[by][rows] * len(values) + codes[field][rows],
+                             minlength=len(groups) * len(values)).reshape(len(groups), len(values))
+        result = OrderedDict()
+        for group in np.argsort(-matrix.sum(axis=1), kind='mergesort'):
+            if matrix[group].sum():
+                result[groups[group]] = OrderedDict(
+                    (values[code], int(matrix[group, code])) for code in np.argsort(-matrix[group], kind='mergesort')
+                    if matrix[group, code]
+                )
+        return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Filter and group cleaned statements through the index')
+    parser.add_argument('--data', default='data/cleaned.pickle', help='cleaned.pickle or a columnar directory')
+    for field in FIELDS:
+        parser.add_argument(f'--{field}', action='append', help=f'keep statements with this {field}, repeatable')
+    parser.add_argument('--text', help='keep statements containing this phrase')
+    parser.add_argument('--year', type=int)
+    parser.add_argument('--group', choices=FIELDS, help='count matches per value of this field')
+    parser.add_argument('--by', choices=FIELDS, help='nest --group counts per value of this field')
+    parser.add_argument('--limit', type=int, default=10, help='matching statements to print')
+    args = parser.parse_args()
+
+    query = Index.open(pickle, args.data).query()
+    query = query.where(**{field: getattr(args, field) for field in FIELDS if getattr(args, field)})
+    if args.text:
+        query = query.contains(args.text)
+    if args.year:
+        query = query.year(args.year)
+    if args.group:
+        print(json.dumps(query.group(args.group, args.by), indent=2))
+    else:
+        matches = query.records()
+        print(len(matches), 'statements')
+        for record in matches[:args.limit]:
+            print(record['id'], record['date'], record['source'], '-', record['rating'], '-', record['text'].strip())
@@ -0,0 +1,189 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+
+from metrics import Metrics
+
+
+def is_timeout(e):
+    # Selenium raises TimeoutException, urllib a socket timeout or a URLError wrapping one
+    return isinstance(e, TimeoutError) or 'timeout' in type(e).__name__.lower() or 'timed out' in str(e)
+
+
+def is_retryable(e):
+    # Client errors come back the same on every attempt, except request timeouts and rate limiting.
+    # A LookupError is a page the offline page cache does not have
+    if isinstance(e, LookupError):
+        return False
+    code = getattr(e, 'code', None)
+    return not (isinstance(code, int) and 400 <= code < 500 and code not in (408, 429))
+
+
+def retry_after(e):
+    headers = getattr(e, 'headers', None)
+    try:
+        return float(headers.get('Retry-After'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    # rate tokens a second up to burst. reserve() takes the next token even when the bucket is empty and
+    # returns how long until it is actually due, so waiting callers queue up at exactly the rate
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class Scheduler:
+    # Runs fetch(url) on a fixed number of threads, lowest priority number first. Every host gets a token
+    # bucket of `rate` requests a second and at most `per_host` requests in flight. A failed fetch is retried
+    # after an exponential backoff with jitter, once retries run out the url goes to dead_letters and its
+    # future raises the last error. requeue() submits the dead letters again, take_dead_letters() hands them over
+    def __init__(self, fetch, workers=4, rate=0, burst=1, per_host=None, retries=3, backoff=0.5, max_backoff=30,
+                 metrics=None, seed=None):
+        self.fetch = fetch
+        self.workers = workers
+        self.rate = rate
+        self.burst = burst
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.metrics = metrics or Metrics()
+        self.dead_letters = []
+        # (priority, sequence, task) ready to start, (due, sequence, task) waiting on a backoff or a token,
+        # and per host the tasks held back by the per host limit
+        self._ready = []
+        self._delayed = []
+        self._blocked = {}
+        self._in_flight = {}
+        self._buckets = {}
+        self._sequence = itertools.count()
+        self._random = random.Random(seed)
+        self._condition = threading.Condition()
+        self._closed = False
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, url, priority=0):
+        task = {'url': url, 'host': urlsplit(url).netloc, 'priority': priority, 'attempt': 0, 'token': False,
+                'submitted': time.monotonic(), 'future': Future()}
+        with self._condition:
+            if self._closed:
+                raise Exception('Scheduler is closed')
+            heapq.heappush(self._ready, (priority, next(self._sequence), task))
+            self._condition.notify()
+        return task['future']
+
+    def get(self, url, priority=0):
+        return self.submit(url, priority).result()
+
+    def take_dead_letters(self):
+        # Returns and clears the dead letters, for callers that retry them their own way
+        with self._condition:
+            letters, self.dead_letters = self.dead_letters, []
+        return letters
+
+    def requeue(self):
+        # Dead letters go back in at their original priority with a fresh set of retries
+        return [self.submit(letter['url'], letter['priority']) for letter in self.take_dead_letters()]
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        # Only reachable when close() is called with work still queued
+        for entry in self._ready + self._delayed:
+            entry[2]['future'].cancel()
+        for tasks in self._blocked.values():
+            for task in tasks:
+                task['future'].cancel()
+
+    def _next(self):
+        # Called holding the condition, returns the next task allowed to start or None once closed
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, _, task = heapq.heappop(self._delayed)
+                heapq.heappush(self._ready, (task['priority'], next(self._sequence), task))
+            if self._closed:
+                return None
+            if self._ready:
+                _, _, task = heapq.heappop(self._ready)
+                host = task['host']
+                if self.per_host and self._in_flight.get(host, 0) >= self.per_host:
+                    self._blocked.setdefault(host, []).append(task)
+                    continue
+                if self.rate and not task['token']:
+                    task['token'] = True
+                    bucket = self._buckets.setdefault(host, TokenBucket(self.rate, self.burst))
+                    delay = bucket.reserve(now)
+                    if delay > 0:
+                        self.metrics.count('rate_limited')
+                        heapq.heappush(self._delayed, (now + delay, next(self._sequence), task))
+                        continue
+                self._in_flight[host] = self._in_flight.get(host, 0) + 1
+                return task
+            self._condition.wait(self._delayed[0][0] - now if self._delayed else None)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                task = self._next()
+            if task is None:
+                return
+            if not task['attempt']:
+                self.metrics.observe('queue_wait', time.monotonic() - task['submitted'])
+            self.metrics.count('fetch_attempts')
+            error = None
+            try:
+                with self.metrics.timer('page_latency'):
+                    result = self.fetch(task['url'])
+            except Exception as e:
+                error = e
+            with self._condition:
+                host = task['host']
+                self._in_flight[host] -= 1
+                for blocked in self._blocked.pop(host, []):
+                    heapq.heappush(self._ready, (blocked['priority'], next(self._sequence), blocked))
+                buried = error is not None and not self._retry(task, error)
+                self._condition.notify_all()
+            if error is None:
+                task['future'].set_result(result)
+            elif buried:
+                task['future'].set_exception(error)
+
+    def _retry(self, task, error):
+        # Called holding the condition, False when the task is given up on
+        self.metrics.count('timeouts' if is_timeout(error) else 'fetch_errors')
+        if task['attempt'] >= self.retries or not is_retryable(error):
+            self.metrics.count('dead_letters')
+            print(task['url'], 'failed after', task['attempt'] + 1, 'attempts:', error)
+            self.dead_letters.append({'url': task['url'], 'priority': task['priority'],
+                                      'attempts': task['attempt'] + 1, 'error': repr(error)})
+            return False
+        # Equal jitter: half the backoff is fixed and half random, so pages that failed together spread out
+        delay = min(self.max_backoff, self.backoff * 2 ** task['attempt'])
+        delay = max(delay / 2 + self._random.uniform(0, delay / 2), retry_after(error) or 0)
+        self.metrics.count('retries')
+        self.metrics.observe('backoff', delay)
+        task['attempt'] += 1
+        task['token'] = False
+        heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._sequence), task))
+        return True
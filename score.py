@@ -0,0 +1,60 @@
+import argparse
+import json
+import sys
+
+from artifact import Model
+from vectorize import normalize
+
+MODEL_PATH = 'data/ratings.npz'
+
+
+def read(lines):
+    # Accepts JSONL records with a 'text' field, JSON strings or plain text lines. A line that parses to
+    # any other JSON value (2016, true, null, a list) is plain text too
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip('\n')
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = line
+        if isinstance(record, str):
+            record = {'text': record}
+        elif not isinstance(record, dict):
+            record = {'text': line}
+        elif not isinstance(record.get('text'), str):
+            print(f"Skipping line {number}: no string 'text' field", file=sys.stderr)
+            continue
+        yield record
+
+
+def score(model, records, output):
+    classes, scores = model.score_batch([normalize(record['text']) for record in records])
+    for record, row in zip(records, scores.tolist()):
+        probabilities = dict(zip(classes.tolist(), row))
+        record['prediction'] = max(probabilities, key=probabilities.get)
+        record['probabilities'] = probabilities
+        output.write(json.dumps(record) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify statements from stdin with a saved rating model')
+    parser.add_argument('model', nargs='?', default=MODEL_PATH)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--no-mmap', action='store_true')
+    args = parser.parse_args()
+
+    model = Model(args.model, mmap=not args.no_mmap)
+    batch = []
+    for record in read(sys.stdin):
+        batch.append(record)
+        if len(batch) == args.batch_size:
+            score(model, batch, sys.stdout)
+            batch = []
+    if batch:
+        score(model, batch, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+import sys
+from operator import attrgetter, itemgetter
+
+FIELDS = ('mugshot', 'source', 'text', 'edition', 'date', 'rating', 'reason', 'affiliation', 'id')
+# Few distinct values repeated across every statement, interned so all records share one string each
+CATEGORICAL = frozenset(('mugshot', 'source', 'edition', 'rating', 'affiliation'))
+
+
+def _intern(field, value):
+    return sys.intern(value) if field in CATEGORICAL and type(value) is str else value
+
+
+class Statement:
+    # One statement from crawl to analysis. Slots instead of a per-record dict of repeated keys, and
+    # statement['text'] works as well as statement.text so dict era code and pickles keep working
+    __slots__ = FIELDS
+
+    def __init__(self, mugshot=None, source=None, text=None, edition=None, date=None, rating=None, reason=None,
+                 affiliation=None, id=None):
+        intern = sys.intern
+        self.mugshot = intern(mugshot) if type(mugshot) is str else mugshot
+        self.source = intern(source) if type(source) is str else source
+        self.text = text
+        self.edition = intern(edition) if type(edition) is str else edition
+        self.date = date
+        self.rating = intern(rating) if type(rating) is str else rating
+        self.reason = reason
+        self.affiliation = intern(affiliation) if type(affiliation) is str else affiliation
+        self.id = id
+
+    @classmethod
+    def from_dict(cls, data):
+        try:
+            return cls(**data)
+        except TypeError:
+            # Keys beyond FIELDS are dropped
+            return cls(**{field: data[field] for field in FIELDS if field in data})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def keys(self):
+        return FIELDS
+
+    def __getitem__(self, field):
+        if field not in FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __setitem__(self, field, value):
+        if field not in FIELDS:
+            raise KeyError(field)
+        setattr(self, field, _intern(field, value))
+
+    def __contains__(self, field):
+        # Matches the dicts this replaced, where 'id' only appeared once a record was cleaned
+        return field in FIELDS and getattr(self, field) is not None
+
+    def get(self, field, default=None):
+        value = getattr(self, field, None) if field in FIELDS else None
+        return default if value is None else value
+
+    def __eq__(self, other):
+        if not isinstance(other, Statement):
+            return NotImplemented
+        return all(getattr(self, field) == getattr(other, field) for field in FIELDS)
+
+    def __repr__(self):
+        return f'Statement({", ".join(f"{field}={getattr(self, field)!r}" for field in FIELDS)})'
+
+    def __reduce__(self):
+        # Pickled as a bare tuple of values, loading runs __init__ and so re-interns the categoricals
+        return Statement, tuple(getattr(self, field) for field in FIELDS)
+
+
+def getter(records, field):
+    # Attribute access skips Statement.__getitem__, the dict path stays for plain dict records
+    if records and isinstance(records[0], Statement):
+        return attrgetter(field)
+    return itemgetter(field)
+
+
+def convert(data):
+    # Compatibility for pickles written before Statement: dicts become Statements at any list depth
+    if isinstance(data, dict):
+        return Statement.from_dict(data)
+    if isinstance(data, (list, tuple)):
+        return [convert(item) for item in data]
+    return data
+
+
+def load(serializer, path):
+    with open(path, 'rb') as file:
+        return convert(serializer.load(file))
@@ -0,0 +1,121 @@
+from collections import Counter
+
+import numpy as np
+
+
+def normalize(text):
+    # Same normalization quotes get before training
+    return text.replace('"', '').replace(',', '').replace('.', '').lower()
+
+
+class CSRMatrix:
+    # Minimal compressed sparse row matrix over plain numpy arrays
+    def __init__(self, indptr, indices, data, shape):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+
+    def __len__(self):
+        return self.shape[0]
+
+    def row_ids(self):
+        # Row index of every stored value, lets per-row sums run as one np.bincount
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def binarize(self):
+        return CSRMatrix(self.indptr, self.indices, np.ones_like(self.data), self.shape)
+
+
+class Vectorizer:
+    # Maps documents to a vocabulary indexed document-term matrix of word and n-gram counts
+    def __init__(self, ngram_range=(1, 1), binary=False):
+        self.ngram_range = ngram_range
+        self.binary = binary
+        self.vocabulary = {}
+
+    def tokenize(self, document):
+        return document.lower().split()
+
+    def _ngrams(self, tokens):
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(tokens) - n + 1):
+                yield ' '.join(tokens[i:i + n]) if n > 1 else tokens[i]
+
+    def fit_transform(self, documents):
+        return self.fit_transform_tokens(self.tokenize(document) for document in documents)
+
+    def transform(self, documents):
+        # Terms outside the fitted vocabulary are dropped
+        return self.transform_tokens(self.tokenize(document) for document in documents)
+
+    def fit_transform_tokens(self, documents):
+        # Documents that are already token lists, e.g. from a Corpus
+        self.vocabulary = {}
+        return self._build(documents, grow=True)
+
+    def transform_tokens(self, documents):
+        return self._build(documents, grow=False)
+
+    def fit_transform_ids(self, ids, lengths, terms):
+        # Documents as one array of integer token ids into `terms` plus the token count of each, as a
+        # Corpus stores them. Unigram counts are built with numpy instead of a Counter per document
+        if self.ngram_range != (1, 1):
+            return self.fit_transform_tokens(self._id_tokens(ids, lengths, terms))
+        unique, first = np.unique(ids, return_index=True)
+        unique = unique[np.argsort(first, kind='mergesort')]
+        # Vocabulary in order of first appearance, the same as the token list path
+        self.vocabulary = {terms[id]: index for index, id in enumerate(unique.tolist())}
+        remap = np.full(len(terms), -1, dtype=np.int64)
+        remap[unique] = np.arange(len(unique))
+        return self._count(remap[ids], lengths)
+
+    def transform_ids(self, ids, lengths, terms):
+        if self.ngram_range != (1, 1):
+            return self.transform_tokens(self._id_tokens(ids, lengths, terms))
+        vocabulary = self.vocabulary
+        remap = np.array([vocabulary.get(term, -1) for term in terms], dtype=np.int64)
+        return self._count(remap[ids], lengths)
+
+    def _id_tokens(self, ids, lengths, terms):
+        ids = ids.tolist()
+        start = 0
+        for length in lengths.tolist():
+            yield [terms[id] for id in ids[start:start + length]]
+            start += length
+
+    def _count(self, columns, lengths):
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        known = columns >= 0
+        keys, counts = np.unique(rows[known] * len(self.vocabulary) + columns[known], return_counts=True)
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // max(len(self.vocabulary), 1), minlength=len(lengths)), out=indptr[1:])
+        matrix = CSRMatrix(indptr, keys % max(len(self.vocabulary), 1), counts.astype(np.float64),
+                           (len(lengths), len(self.vocabulary)))
+        return matrix.binarize() if self.binary else matrix
+
+    def _build(self, documents, grow):
+        vocabulary = self.vocabulary
+        indptr = [0]
+        indices = []
+        data = []
+        for tokens in documents:
+            counts = Counter()
+            for term in self._ngrams(tokens):
+                index = vocabulary.get(term)
+                if index is None:
+                    if not grow:
+                        continue
+                    index = vocabulary[term] = len(vocabulary)
+                counts[index] += 1
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        matrix = CSRMatrix(
+            np.array(indptr, dtype=np.int64),
+            np.array(indices, dtype=np.int64),
+            np.array(data, dtype=np.float64),
+            (len(indptr) - 1, len(vocabulary))
+        )
+        return matrix.binarize() if self.binary else matrix
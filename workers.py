@@ -0,0 +1,72 @@
+import urllib.error
+import urllib.request
+
+from selenium import webdriver
+
+
+class HttpWorker:
+    # Plain HTTP fetching for pages that render without javascript, through a PageCache when given one
+    def __init__(self, timeout=15, retries=1, user_agent='politifact-crawler', cache=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.headers = {'User-Agent': user_agent}
+        self.cache = cache
+
+    def get(self, url):
+        if self.cache is not None:
+            return self.cache.get(url, self.fetch)
+        _, body, final_url, _ = self.fetch(url)
+        return body, final_url
+
+    def fetch(self, url, headers=None):
+        # (status, body, final url, response headers), a 304 answer to a conditional request has no body
+        for attempt in range(self.retries + 1):
+            try:
+                request = urllib.request.Request(url, headers={**self.headers, **(headers or {})})
+                try:
+                    with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                        charset = response.headers.get_content_charset() or 'utf-8'
+                        body = response.read().decode(charset, errors='replace')
+                        return response.status, body, response.geturl(), response.headers
+                except urllib.error.HTTPError as e:
+                    if e.code != 304:
+                        raise
+                    return e.code, None, e.geturl(), e.headers
+            except Exception as e:
+                print(url, e)
+                if attempt == self.retries:
+                    raise
+
+    def close(self):
+        pass
+
+
+class BrowserWorker:
+    # One headless browser per worker, the page load timeout is set once instead of toggled per call
+    def __init__(self, timeout=15, retries=1, headless=True):
+        self.timeout = timeout
+        self.retries = retries
+        options = webdriver.FirefoxOptions()
+        if headless:
+            options.add_argument('-headless')
+        self.driver = webdriver.Firefox(options=options)
+        self.driver.set_page_load_timeout(timeout)
+
+    def get(self, url):
+        for attempt in range(self.retries + 1):
+            try:
+                self.driver.get(url)
+                return self.driver.page_source, self.driver.current_url
+            except Exception as e:
+                print(url, e)
+                if attempt == self.retries:
+                    raise
+
+    def close(self):
+        self.driver.quit()
+
+
+WORKERS = {
+    'http': HttpWorker,
+    'browser': BrowserWorker
+}